@@ -0,0 +1,138 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост {number}',
+                group=cls.group if number % 2 else None
+            )
+            for number in range(5)
+        ]
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.posts[0], author=cls.reader,
+                text=f'Комментарий {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_post_list_cursor_pagination(self):
+        """ Лента листается курсором от новых постов к старым. """
+        url = reverse('api:post_list')
+        first = self.guest_client.get(url, {'size': 3}).json()
+        self.assertEqual(
+            [post['id'] for post in first['results']],
+            [post.pk for post in self.posts[::-1][:3]]
+        )
+        self.assertIsNone(first['previous'])
+        second = self.guest_client.get(first['next']).json()
+        self.assertEqual(
+            [post['id'] for post in second['results']],
+            [post.pk for post in self.posts[::-1][3:]]
+        )
+        self.assertIsNone(second['next'])
+
+    def test_post_list_serializes_without_models(self):
+        """ Страница ленты строится одним запросом к БД
+        (второй — ревизии для ETag). """
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(reverse('api:post_list'))
+        post = response.json()['results'][0]
+        self.assertEqual(post['author'], 'author')
+        self.assertEqual(
+            set(post),
+            {'id', 'text', 'pub_date', 'author', 'group', 'image',
+             'comments_count'}
+        )
+
+    def test_field_selection(self):
+        """ ?fields= оставляет только запрошенные поля. """
+        response = self.guest_client.get(
+            reverse('api:post_list'), {'fields': 'id,group'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'group'})
+        response = self.guest_client.get(
+            reverse('api:post_list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filtered_lists(self):
+        """ Посты группы и автора, лента подписок. """
+        cases = (
+            (self.guest_client, reverse(
+                'api:group_posts', kwargs={'slug': 'group'}), 2),
+            (self.guest_client, reverse(
+                'api:user_posts', kwargs={'username': 'author'}), 5),
+            (self.guest_client, reverse(
+                'api:user_posts', kwargs={'username': 'reader'}), 0),
+            (self.reader_client, reverse('api:follow_posts'), 5),
+        )
+        for client, url, count in cases:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(len(response.json()['results']), count)
+
+    def test_post_detail_and_comments(self):
+        """ Пост и его комментарии с выбором порядка. """
+        post = self.posts[0]
+        response = self.guest_client.get(
+            reverse('api:post_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(response.json()['comments_count'], 3)
+        response = self.guest_client.get(
+            reverse('api:comment_list', kwargs={'post_id': post.pk}),
+            {'order': 'newest', 'fields': 'text,author'}
+        )
+        self.assertEqual(
+            response.json()['results'][0],
+            {'text': 'Комментарий 2', 'author': 'reader'}
+        )
+
+    def test_list_etag_covers_comments(self):
+        """ Новый комментарий меняет ETag списка: в нём comments_count. """
+        url = reverse('api:post_list')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=self.posts[1], author=self.reader, text='Новый')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_errors(self):
+        """ Ошибки возвращаются в JSON с нужным статусом. """
+        cases = (
+            (reverse('api:post_detail', kwargs={'post_id': 0}), 404),
+            (reverse('api:comment_list', kwargs={'post_id': 0}), 404),
+            (reverse('api:group_posts', kwargs={'slug': 'missing'}), 404),
+            (reverse('api:follow_posts'), 401),
+        )
+        for url, status in cases:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('error', response.json())
+
+    def test_follow_posts_requires_login_before_etag(self):
+        """ Аноним с подходящим If-None-Match получает 401, а не 304. """
+        url = reverse('api:follow_posts')
+        etag = self.guest_client.get(reverse('api:post_list'))['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,207 @@
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from posts.feed import follow_feed
+from posts.models import Comment, Group, Post, User
+from posts.revisions import get_revisions
+from posts.utils import (COMMENT_ORDERINGS, CURSOR_ORDERING, CursorPaginator,
+                         get_page_size)
+from posts.views import listing_etag, post_etag
+
+# Имя поля в ответе: путь для .values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def api_view(view):
+    """Только GET; ApiError превращается в JSON с нужным статусом."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return json_response({'error': error.message}, error.status)
+    return wrapper
+
+
+def login_required(view):
+    """401 для анонима — раньше condition, иначе If-None-Match дал бы 304."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            raise ApiError('Требуется авторизация.', status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def select_fields(request, fields):
+    """Поля ответа из ?fields=a,b; без параметра — все."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(fields)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}.')
+    return names
+
+
+def serialize(rows, names, fields):
+    """Словари из .values() в ответ API без создания моделей."""
+    paths = [(name, fields[name]) for name in names]
+    with_image = 'image' in names
+    results = []
+    for row in rows:
+        item = {name: row[path] for name, path in paths}
+        if with_image:
+            item['image'] = (
+                f'{settings.MEDIA_URL}{item["image"]}'
+                if item['image'] else None
+            )
+        results.append(item)
+    return results
+
+
+def page_link(request, **params):
+    query = request.GET.copy()
+    for param in ('after', 'before'):
+        query.pop(param, None)
+    query.update(params)
+    return f'{request.path}?{query.urlencode()}'
+
+
+def cursor_page(request, queryset, fields, ordering=CURSOR_ORDERING):
+    """Страница строк .values() по курсору и выбранные поля."""
+    names = select_fields(request, fields)
+    keys = {field.lstrip('-') for field in ordering}
+    rows = queryset.values(*({fields[name] for name in names} | keys))
+    page = CursorPaginator(rows, get_page_size(request), ordering).page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before')
+    )
+    return names, page
+
+
+def page_response(request, names, page, fields):
+    return json_response({
+        'results': serialize(page, names, fields),
+        'next': (
+            page_link(request, after=page.next_cursor)
+            if page.has_next() else None
+        ),
+        'previous': (
+            page_link(request, before=page.previous_cursor)
+            if page.has_previous() else None
+        ),
+    })
+
+
+def paginated(request, queryset, fields, ordering=CURSOR_ORDERING):
+    """Ответ {results, next, previous} для страницы queryset."""
+    names, page = cursor_page(request, queryset, fields, ordering)
+    return page_response(request, names, page, fields)
+
+
+def posts_etag(request, *args, **kwargs):
+    """listing_etag плюс ревизия 'comments': в списке есть comments_count."""
+    revisions = get_revisions(request, 'listing', 'comments')
+    etag = listing_etag(request)
+    if etag is None:
+        return None
+    return f'{etag}-{revisions["comments"][0]}'
+
+
+def get_pk(queryset, message):
+    pk = queryset.values_list('pk', flat=True).first()
+    if pk is None:
+        raise ApiError(message, status=404)
+    return pk
+
+
+@api_view
+@condition(etag_func=posts_etag)
+def post_list(request):
+    return paginated(request, Post.objects.all(), POST_FIELDS)
+
+
+@api_view
+@condition(etag_func=posts_etag)
+def group_posts(request, slug):
+    group_id = get_pk(Group.objects.filter(slug=slug), 'Группа не найдена.')
+    return paginated(
+        request, Post.objects.filter(group_id=group_id), POST_FIELDS)
+
+
+@api_view
+@condition(etag_func=posts_etag)
+def user_posts(request, username):
+    author_id = get_pk(
+        User.objects.filter(username=username), 'Автор не найден.')
+    return paginated(
+        request, Post.objects.filter(author_id=author_id), POST_FIELDS)
+
+
+@api_view
+@login_required
+@condition(etag_func=posts_etag)
+def follow_posts(request):
+    return paginated(request, follow_feed(request.user), POST_FIELDS)
+
+
+@api_view
+@condition(etag_func=post_etag)
+def post_detail(request, post_id):
+    names = select_fields(request, POST_FIELDS)
+    row = Post.objects.filter(pk=post_id).values(
+        *{POST_FIELDS[name] for name in names}).first()
+    if row is None:
+        raise ApiError('Пост не найден.', status=404)
+    return json_response(serialize([row], names, POST_FIELDS)[0])
+
+
+@api_view
+@condition(etag_func=post_etag)
+def comment_list(request, post_id):
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERINGS:
+        order = settings.COMMENTS_ORDER
+    names, page = cursor_page(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        COMMENT_FIELDS,
+        COMMENT_ORDERINGS[order]
+    )
+    if not len(page) and not Post.objects.filter(pk=post_id).exists():
+        raise ApiError('Пост не найден.', status=404)
+    return page_response(request, names, page, COMMENT_FIELDS)
@@ -0,0 +1,30 @@
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.observe(
+                'yatube_template_render_seconds',
+                time.perf_counter() - started,
+                template=self.template.origin.template_name or '<string>'
+            )
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, замеряющий время рендеринга шаблонов."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(
+            self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
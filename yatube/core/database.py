@@ -0,0 +1,126 @@
+import logging
+import os
+import random
+import sqlite3
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LOCK_ERRORS = ('database is locked', 'database table is locked')
+
+
+def _database_file(connection):
+    name = connection.settings_dict['NAME']
+    if not name or name == ':memory:' or 'mode=memory' in str(name):
+        return None
+    return name
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Включает WAL и прочие PRAGMA из SQLITE_PRAGMAS.
+
+    Заодно запоминает inode файла базы: если файл подменили
+    (например, синхронизацией реплики), соединение не переиспользуется.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    path = _database_file(connection)
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            if path is None and pragma in ('journal_mode', 'mmap_size'):
+                continue
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+    connection.database_inode = _inode(path) if path else None
+
+
+def is_healthy(connection):
+    """Можно ли переиспользовать открытое постоянное соединение."""
+    if not connection.is_usable():
+        return False
+    if connection.vendor == 'sqlite':
+        path = _database_file(connection)
+        if path and getattr(connection, 'database_inode', None) != (
+                _inode(path)):
+            return False
+    return True
+
+
+@receiver(request_started)
+def check_persistent_connections(sender, **kwargs):
+    """Проверка постоянных соединений (CONN_MAX_AGE) перед запросом.
+
+    Django сам закрывает устаревшие соединения, но живое проверяет,
+    только если в нём уже была ошибка; здесь проверяется каждое.
+    """
+    if not settings.DATABASE_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if not is_healthy(connection):
+            logger.warning(
+                'Соединение %s не прошло проверку и закрыто',
+                connection.alias)
+            connection.close()
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return any(lock_error in message for lock_error in LOCK_ERRORS)
+
+
+def retry_on_lock(view):
+    """Повторяет view, если SQLite ответил «database is locked».
+
+    Повтор возможен только вне транзакции, поэтому декоратор ставится
+    снаружи transaction.atomic. Пауза растёт вдвое с каждой попыткой
+    (DATABASE_RETRY_DELAY, случайный разброс до 50%); после
+    DATABASE_RETRY_ATTEMPTS попыток ошибка пробрасывается.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        attempts = settings.DATABASE_RETRY_ATTEMPTS
+        for attempt in range(1, attempts + 1):
+            try:
+                return view(request, *args, **kwargs)
+            except OperationalError as error:
+                if (attempt == attempts or not is_lock_error(error)
+                        or any(connection.in_atomic_block
+                               for connection in connections.all())):
+                    raise
+                delay = settings.DATABASE_RETRY_DELAY * 2 ** (attempt - 1)
+                logger.warning(
+                    'База занята (%s), попытка %d из %d через %.3f с',
+                    view.__name__, attempt, attempts, delay)
+                time.sleep(delay * random.uniform(1, 1.5))
+    return wrapper
+
+
+def copy_database(source, path, pages=1024):
+    """Копирует SQLite-базу соединения source в файл path (backup API).
+
+    Копия пишется по pages страниц с отпусканием блокировки между
+    шагами, поэтому основная база во время копирования пишется, а
+    читатели path видят либо старое, либо новое состояние целиком.
+    """
+    source.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        source.connection.backup(target, pages=pages)
+    finally:
+        target.close()
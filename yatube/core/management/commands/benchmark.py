@@ -0,0 +1,278 @@
+import copy
+import json
+import math
+import statistics
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+URLCONFS = (
+    ('posts', 'posts.urls'),
+    ('users', 'users.urls'),
+    ('about', 'about.urls'),
+)
+
+# Замеры с пустым и с заполненным кэшем (см. Command.measure)
+MODES = ('cold', 'warm')
+
+# Дополнительные варианты запроса для отдельных страниц
+EXTRA_PARAMS = {
+    'posts:index': ({'page': settings.POSTS_MAX_PAGE},),
+    'posts:profile': ({'page': settings.POSTS_MAX_PAGE},),
+}
+
+
+class Rollback(Exception):
+    """Откатывает изменения, сделанные запросом бенчмарка."""
+
+
+def percentile(values, fraction):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет все страницы posts, users и about через тестовый '
+        'клиент на текущей базе (см. seed), пишет JSON-отчёт '
+        'с p50/p95, числом и временем запросов к БД и размером ответа '
+        'и сравнивает его с сохранённым baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--baseline',
+            help='Отчёт, с которым сравнивать результаты.')
+        parser.add_argument(
+            '--latency-threshold', type=float, default=0.2,
+            help='Допустимый рост p95, доля (0.2 — на 20%%).')
+        parser.add_argument(
+            '--latency-floor', type=float, default=2.0,
+            help='Рост p95 меньше этого числа мс не считается регрессией.')
+        parser.add_argument(
+            '--queries-threshold', type=int, default=0,
+            help='Допустимый рост числа запросов к БД.')
+        parser.add_argument(
+            '--size-threshold', type=float, default=0.1,
+            help='Допустимый рост размера ответа, доля.')
+        parser.add_argument(
+            '--only',
+            help='Только страницы, в имени которых есть эта подстрока.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        if not Post.objects.exists():
+            raise CommandError(
+                'В базе нет постов: сначала выполните manage.py seed.')
+        fixtures = self.fixtures()
+        report = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+            },
+            'views': {},
+        }
+        # Запросы считаются по default, поэтому реплики не используются
+        with override_settings(DEBUG=False, DATABASE_REPLICAS=[]):
+            for case, url, client in self.cases(fixtures):
+                report['views'][case] = self.measure(url, client)
+                self.write_row(case, report['views'][case])
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Отчёт: {options["output"]}')
+        if options['baseline']:
+            self.compare(report, options['baseline'])
+
+    def fixtures(self):
+        """Самые тяжёлые объекты базы для подстановки в URL."""
+        post = Post.objects.order_by('-comments_count', '-pk').first()
+        author = User.objects.order_by(
+            '-stats__posts_count', 'pk').first()
+        reader = User.objects.order_by(
+            '-stats__following_count', 'pk').first()
+        group = Group.objects.annotate(
+            total=Count('posts')).order_by('-total', 'pk').first()
+        return {
+            'post_id': post.pk,
+            'username': author.username,
+            'slug': group.slug if group else None,
+            'query': post.text.split()[0] if post.text.split() else '',
+            'reader': reader,
+        }
+
+    def cases(self, fixtures):
+        anonymous = Client()
+        reader = Client()
+        reader.force_login(fixtures['reader'])
+        clients = (('anon', anonymous), ('auth', reader))
+        for namespace, module in URLCONFS:
+            for pattern in import_module(module).urlpatterns:
+                name = f'{namespace}:{pattern.name}'
+                kwargs = {
+                    key: fixtures.get(key)
+                    for key in pattern.pattern.converters
+                }
+                if None in kwargs.values():
+                    self.stderr.write(f'Пропущено {name}: нет данных.')
+                    continue
+                url = reverse(name, kwargs=kwargs)
+                variants = [{}]
+                variants.extend(EXTRA_PARAMS.get(name, ()))
+                if name == 'posts:search':
+                    variants = [{'q': fixtures['query']}]
+                for params in variants:
+                    query = '&'.join(
+                        f'{key}={value}' for key, value in params.items())
+                    target = f'{url}?{query}' if query else url
+                    for user, client in clients:
+                        case = f'{name} {target} [{user}]'
+                        if self.options['only'] and (
+                                self.options['only'] not in case):
+                            continue
+                        yield case, target, client
+
+    def request(self, url, client):
+        """Выполняет запрос и откатывает все его изменения в базе.
+
+        Куки клиента тоже восстанавливаются, чтобы, например, logout
+        не разлогинил читателя для следующих страниц.
+        """
+        result = {}
+        cookies = copy.deepcopy(client.cookies)
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    try:
+                        response = client.get(url)
+                    except Exception:
+                        # Тестовый клиент пробрасывает исключения view;
+                        # в отчёте это просто ответ 500.
+                        status, size = 500, 0
+                    else:
+                        status = response.status_code
+                        if response.streaming:
+                            size = sum(len(chunk) for chunk in response)
+                        else:
+                            size = len(response.content)
+                    elapsed = time.perf_counter() - started
+                result.update(
+                    status=status,
+                    elapsed=elapsed,
+                    queries=len(queries),
+                    query_time=sum(
+                        float(query['time']) for query in queries),
+                    size=size,
+                )
+                raise Rollback
+        except Rollback:
+            pass
+        client.cookies = cookies
+        return result
+
+    def measure(self, url, client):
+        """Замеры с пустым кэшем перед каждым запросом (cold) и с
+        заполненным (warm): иначе фрагменты лент, счётчики и шапки
+        берутся из кэша и регрессии шаблонов не видны.
+        """
+        for _ in range(self.options['warmup']):
+            self.request(url, client)
+        result = {'url': url}
+        sizes = []
+        for mode in MODES:
+            runs = []
+            for _ in range(max(1, self.options['repeat'])):
+                if mode == 'cold':
+                    cache.clear()
+                runs.append(self.request(url, client))
+            latencies = [run['elapsed'] * 1000 for run in runs]
+            result[mode] = {
+                'p50_ms': round(statistics.median(latencies), 3),
+                'p95_ms': round(percentile(latencies, 0.95), 3),
+                'queries': max(run['queries'] for run in runs),
+                'query_ms': round(statistics.median(
+                    run['query_time'] * 1000 for run in runs), 3),
+            }
+            sizes.extend(run['size'] for run in runs)
+        result.update(status=runs[-1]['status'], bytes=max(sizes))
+        return result
+
+    def write_row(self, case, result):
+        if self.options['verbosity'] < 1:
+            return
+        timings = '; '.join(
+            f'{mode}: p50 {result[mode]["p50_ms"]:.1f} мс, '
+            f'p95 {result[mode]["p95_ms"]:.1f} мс, '
+            f'запросов {result[mode]["queries"]} '
+            f'({result[mode]["query_ms"]:.1f} мс)'
+            for mode in MODES
+        )
+        self.stdout.write(
+            f'{case}: {result["status"]}, {timings}, '
+            f'{result["bytes"]} байт')
+
+    def compare(self, report, baseline_path):
+        """Сравнивает отчёт с baseline и падает при регрессиях."""
+        try:
+            with open(baseline_path, encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)['views']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать baseline: {error}')
+        options = self.options
+        regressions = []
+        for case, result in report['views'].items():
+            base = baseline.get(case)
+            if base is None:
+                continue
+            for mode in MODES:
+                if mode not in base:
+                    continue
+                regressions.extend(
+                    f'{case} [{mode}]: {problem}'
+                    for problem in self.regressions(base[mode], result[mode])
+                )
+            if result['bytes'] > base['bytes'] * (
+                    1 + options['size_threshold']):
+                regressions.append(
+                    f'{case}: размер {base["bytes"]} → {result["bytes"]}')
+            if result['status'] != base['status']:
+                regressions.append(
+                    f'{case}: статус {base["status"]} → {result["status"]}')
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно baseline:\n'
+                + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def regressions(self, base, result):
+        options = self.options
+        latency_limit = max(
+            base['p95_ms'] * (1 + options['latency_threshold']),
+            base['p95_ms'] + options['latency_floor'],
+        )
+        if result['p95_ms'] > latency_limit:
+            yield f'p95 {base["p95_ms"]} → {result["p95_ms"]} мс'
+        if result['queries'] > base['queries'] + options['queries_threshold']:
+            yield f'запросов {base["queries"]} → {result["queries"]}'
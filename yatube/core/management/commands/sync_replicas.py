@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.database import copy_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу в файлы реплик из '
+        'DATABASE_REPLICAS. С --interval повторяет копирование, '
+        'имитируя отстающую реплику при локальной разработке.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, nargs='?',
+            const=settings.REPLICA_SYNC_INTERVAL,
+            help='Копировать раз в столько секунд, пока не прервут.')
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite':
+            raise CommandError('Копирование реплик есть только для SQLite.')
+        names = {}
+        for alias in settings.DATABASE_REPLICAS:
+            name = connections[alias].settings_dict['NAME']
+            if name == source.settings_dict['NAME']:
+                raise CommandError(
+                    f'Реплика {alias} указывает на основную базу.')
+            names[alias] = name
+        interval = options['interval']
+        while True:
+            for alias, name in names.items():
+                started = time.perf_counter()
+                copy_database(source, name)
+                self.stdout.write(
+                    f'{alias}: {name} за '
+                    f'{time.perf_counter() - started:.2f} с')
+            if interval is None:
+                return
+            time.sleep(interval)
@@ -0,0 +1,187 @@
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+PROCESSES_KEY = 'metrics:processes'
+SNAPSHOT_KEY = 'metrics:snapshot:{}'
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+# name: (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Обработанные запросы.', None),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.', LATENCY_BUCKETS),
+    'yatube_db_queries_per_request': (
+        'histogram', 'Число запросов к БД за запрос.', QUERY_COUNT_BUCKETS),
+    'yatube_db_duration_seconds': (
+        'histogram', 'Время запросов к БД за запрос.', LATENCY_BUCKETS),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время рендеринга шаблона.', LATENCY_BUCKETS),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кэшу по результату (hit/miss).', None),
+}
+
+
+def _cache():
+    return caches[settings.METRICS_CACHE]
+
+
+class Registry:
+    """Метрики текущего процесса.
+
+    Значения накапливаются в памяти под блокировкой, а не чаще раза
+    в METRICS_FLUSH_INTERVAL секунд снимок целиком пишется в кэш.
+    /metrics суммирует снимки всех процессов из общего кэша
+    METRICS_CACHE (по умолчанию файловый), то есть всех воркеров.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = f'{socket.gethostname()}:{os.getpid()}'
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.flushed = 0
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [
+                    [0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {
+                    key: [list(value[0]), value[1], value[2]]
+                    for key, value in self.histograms.items()
+                },
+            }
+
+    def flush(self, force=False):
+        """Пишет снимок процесса в кэш, если пора (или force)."""
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        _cache().set(
+            SNAPSHOT_KEY.format(self.process),
+            self.snapshot(),
+            settings.METRICS_TTL
+        )
+        processes = _cache().get(PROCESSES_KEY) or []
+        if self.process not in processes:
+            processes = [*processes, self.process]
+            _cache().set(PROCESSES_KEY, processes, None)
+
+
+registry = Registry()
+
+
+def inc(name, value=1, **labels):
+    if settings.METRICS_ENABLED:
+        registry.inc(name, labels, value)
+
+
+def observe(name, value, **labels):
+    if settings.METRICS_ENABLED:
+        registry.observe(name, labels, value)
+
+
+def record_cache(name, hit):
+    inc('yatube_cache_requests_total', cache=name,
+        result='hit' if hit else 'miss')
+
+
+def collect():
+    """Сумма снимков всех живых процессов."""
+    registry.flush(force=True)
+    processes = _cache().get(PROCESSES_KEY) or []
+    snapshots = _cache().get_many(
+        [SNAPSHOT_KEY.format(process) for process in processes])
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots.values():
+        for key, value in snapshot['counters'].items():
+            counters[key] += value
+        for key, (buckets, total, count) in snapshot['histograms'].items():
+            merged = histograms.setdefault(
+                key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    alive = [
+        process for process in processes
+        if SNAPSHOT_KEY.format(process) in snapshots
+    ]
+    if alive != processes:
+        _cache().set(PROCESSES_KEY, alive, None)
+    return counters, histograms
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), value in sorted(histograms.items()):
+            if metric != name:
+                continue
+            counts, total, count = value
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(
+                    f'{name}_bucket{_labels(labels, (("le", bound),))} '
+                    f'{bucket_count}')
+            lines.append(
+                f'{name}_bucket{_labels(labels, (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
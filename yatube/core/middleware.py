@@ -0,0 +1,108 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from . import metrics
+
+
+class QueryTimer:
+    """execute_wrapper, считающий запросы к БД и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Собирает по имени URL число запросов, задержку и работу с БД.
+
+    Стоит первым в MIDDLEWARE, чтобы задержка включала остальные
+    middleware. Для потоковых ответов учитывается время до отдачи
+    первого байта.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            # Учитываются и реплики (core.routers)
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        metrics.inc(
+            'yatube_requests_total',
+            view=view, method=request.method, status=response.status_code)
+        metrics.observe(
+            'yatube_request_duration_seconds', duration, view=view)
+        metrics.observe(
+            'yatube_db_queries_per_request', timer.count, view=view)
+        metrics.observe(
+            'yatube_db_duration_seconds', timer.duration, view=view)
+        metrics.registry.flush()
+        return response
+
+
+class WriteDetector:
+    """execute_wrapper, замечающий запись, которая дошла до COMMIT."""
+
+    WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.committed = False
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.lstrip()[:7].upper().startswith(self.WRITE_STATEMENTS):
+            # Вне транзакции срабатывает сразу, при откате — никогда
+            transaction.on_commit(
+                self.mark_committed, using=self.connection.alias)
+        return result
+
+    def mark_committed(self):
+        self.committed = True
+
+
+class ReadPrimaryAfterWriteMiddleware:
+    """Если запрос записал что-то в default и запись закоммичена, ставит
+    cookie, с которой read_from_replica REPLICA_STICKY_SECONDS читает
+    из default.
+
+    Так автор сразу видит свой пост, комментарий или подписку, даже
+    если реплика ещё не догнала основную базу. Метод запроса не важен:
+    подписка, например, оформляется GET-запросом.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        detector = WriteDetector(connections[DEFAULT_DB_ALIAS])
+        with detector.connection.execute_wrapper(detector):
+            response = self.get_response(request)
+        if detector.committed:
+            seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE,
+                f'{time.time() + seconds:.3f}',
+                max_age=seconds,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
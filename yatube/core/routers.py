@@ -0,0 +1,88 @@
+import os
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def replica_aliases():
+    """Реплики, из которых сейчас можно читать.
+
+    Пропускаются реплики, ещё не созданные sync_replicas, и указывающие
+    на ту же базу, что и default (так бывает в тестах с TEST MIRROR):
+    их данные надёжнее читать через соединение default.
+    """
+    primary = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+    aliases = []
+    for alias in settings.DATABASE_REPLICAS:
+        name = connections[alias].settings_dict['NAME']
+        if name != primary and os.path.exists(name):
+            aliases.append(alias)
+    return aliases
+
+
+def cache_timeout(timeout, using):
+    """Срок хранения в кэше данных, прочитанных из базы using.
+
+    Реплика может отставать от default до REPLICA_STICKY_SECONDS, и
+    прочитанное из неё легло бы в кэш под уже сдвинутой версией,
+    поэтому такое значение живёт не дольше этого окна.
+    """
+    if using == DEFAULT_DB_ALIAS:
+        return timeout
+    if timeout is None:
+        return settings.REPLICA_STICKY_SECONDS
+    return min(timeout, settings.REPLICA_STICKY_SECONDS)
+
+
+def reads_primary(request):
+    """Писал ли пользователь недавно (см. ReadPrimaryAfterWriteMiddleware)."""
+    try:
+        until = float(request.COOKIES[settings.REPLICA_STICKY_COOKIE])
+    except (KeyError, ValueError):
+        return False
+    return until > time.time()
+
+
+def read_from_replica(view):
+    """Запросы на чтение внутри view уходят в реплику.
+
+    Только для view, которые ничего не пишут. Пока после записи
+    пользователя не истекло REPLICA_STICKY_SECONDS, чтение остаётся
+    в default. Реплика выбирается одна на весь вызов view: так ревизии
+    для ETag и сами данные берутся из одного снимка.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        previous = getattr(_state, 'replica', None)
+        aliases = [] if reads_primary(request) else replica_aliases()
+        _state.replica = random.choice(aliases) if aliases else None
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = previous
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтение в read_from_replica — из выбранной для view реплики,
+    остальное и вся запись — в default. Миграции применяются только
+    к default, реплики получают схему вместе с данными.
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
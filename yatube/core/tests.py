@@ -1,4 +1,30 @@
-from django.test import Client, TestCase
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db import (OperationalError, connection, connections, router,
+                       transaction)
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+
+from posts.models import Follow, Group, Post
+
+from . import metrics
+from .database import copy_database, is_healthy, retry_on_lock
+from .middleware import ReadPrimaryAfterWriteMiddleware
+from .routers import (ReplicaRouter, cache_timeout, read_from_replica,
+                      replica_aliases)
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -15,3 +41,347 @@ class ViewTestClass(TestCase):
         """ Cтраница 404 отдает кастомный шаблон. """
         response = self.guest_client.get('/group/general/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class BenchmarkCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.create(author=cls.author, text='Пост', group=group)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.report = os.path.join(directory.name, 'report.json')
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark', repeat=1, warmup=0, output=self.report,
+            stdout=open(os.devnull, 'w'), stderr=open(os.devnull, 'w'),
+            **options)
+        with open(self.report, encoding='utf-8') as report:
+            return json.load(report)
+
+    def test_report_covers_urls_and_rolls_back(self):
+        """ Отчёт содержит страницы всех приложений, база не меняется. """
+        views = self.benchmark()['views']
+        for case in ('posts:index / [anon]', 'about:tech /about/tech/ [auth]',
+                     'users:login /auth/login/ [anon]'):
+            with self.subTest(case=case):
+                self.assertIn(case, views)
+                self.assertEqual(views[case]['status'], 200)
+        index = views['posts:index / [anon]']
+        self.assertEqual(
+            set(index), {'url', 'status', 'bytes', 'cold', 'warm'})
+        self.assertEqual(
+            set(index['cold']), {'p50_ms', 'p95_ms', 'queries', 'query_ms'})
+        # С пустым кэшем лента заново читается из базы
+        self.assertGreater(
+            index['cold']['queries'], index['warm']['queries'])
+        self.assertFalse(Follow.objects.exists())
+
+    def test_regression_against_baseline(self):
+        """ Рост числа запросов относительно baseline — ошибка. """
+        baseline = self.benchmark(only='posts:index / [anon]')
+        baseline['views']['posts:index / [anon]']['cold']['queries'] = -1
+        baseline_path = f'{self.report}.baseline'
+        with open(baseline_path, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baseline, baseline_file)
+        with self.assertRaisesMessage(CommandError, 'запросов -1'):
+            self.benchmark(
+                only='posts:index / [anon]', baseline=baseline_path)
+
+
+@override_settings(METRICS_CACHE='default')
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def scrape(self):
+        response = self.guest_client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        return {
+            line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in response.content.decode().splitlines()
+            if not line.startswith('#')
+        }
+
+    def test_request_metrics(self):
+        """ Запросы, БД, шаблоны и кэш учитываются по имени страницы. """
+        before = self.scrape()
+        self.guest_client.get('/')
+        self.guest_client.get('/')
+        after = self.scrape()
+        cases = (
+            'yatube_requests_total'
+            '{method="GET",status="200",view="posts:index"}',
+            'yatube_request_duration_seconds_count{view="posts:index"}',
+            'yatube_db_queries_per_request_count{view="posts:index"}',
+            'yatube_template_render_seconds_count'
+            '{template="posts/index.html"}',
+            'yatube_cache_requests_total{cache="listing",result="hit"}',
+        )
+        for name in cases:
+            with self.subTest(metric=name):
+                self.assertGreater(after[name], before.get(name, 0))
+        self.assertEqual(
+            after['yatube_request_duration_seconds_bucket'
+                  '{view="posts:index",le="+Inf"}'],
+            after['yatube_request_duration_seconds_count{view="posts:index"}']
+        )
+
+    def test_processes_are_aggregated(self):
+        """ Снимки других процессов суммируются с текущим. """
+        self.guest_client.get('/about/tech/')
+        name = (
+            'yatube_requests_total'
+            '{method="GET",status="200",view="about:tech"}'
+        )
+        own = self.scrape()[name]
+        key = (
+            'yatube_requests_total',
+            (('method', 'GET'), ('status', 200), ('view', 'about:tech'))
+        )
+        cache.set(
+            metrics.SNAPSHOT_KEY.format('worker:2'),
+            {'counters': {key: 5.0}, 'histograms': {}}
+        )
+        cache.set(
+            metrics.PROCESSES_KEY,
+            [*cache.get(metrics.PROCESSES_KEY), 'worker:2']
+        )
+        self.assertEqual(self.scrape()[name], own + 5)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_restricted_by_ip(self):
+        """ Эндпоинт закрыт для адресов вне METRICS_ALLOWED_IPS. """
+        response = self.guest_client.get('/metrics')
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_loopback_only_by_default(self):
+        """ По умолчанию метрики отдаются только на localhost. """
+        response = self.guest_client.get('/metrics', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """ С METRICS_TOKEN без верного Bearer-токена метрик нет. """
+        cases = (
+            ({}, 404),
+            ({'HTTP_AUTHORIZATION': 'Bearer wrong'}, 404),
+            ({'HTTP_AUTHORIZATION': 'Bearer secret'}, 200),
+        )
+        for headers, status in cases:
+            with self.subTest(headers=headers):
+                response = self.guest_client.get('/metrics', **headers)
+                self.assertEqual(response.status_code, status)
+
+
+class DatabaseSettingsTests(TestCase):
+    def pragma(self, cursor, name):
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """ Новое соединение SQLite получает PRAGMA из настроек. """
+        with connection.cursor() as cursor:
+            self.assertEqual(self.pragma(cursor, 'busy_timeout'), 5000)
+            self.assertEqual(self.pragma(cursor, 'synchronous'), 1)
+            self.assertEqual(self.pragma(cursor, 'cache_size'), -20000)
+
+    def test_file_database_wal_and_health_check(self):
+        """ Файловая база в режиме WAL; подмена файла закрывает
+        постоянное соединение. """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'db.sqlite3')
+        wrapper = type(connections['default'])(
+            {**connection.settings_dict, 'NAME': path}, alias='wal')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            self.assertEqual(self.pragma(cursor, 'journal_mode'), 'wal')
+        self.assertTrue(is_healthy(wrapper))
+        replacement = os.path.join(directory, 'replica.sqlite3')
+        sqlite3.connect(replacement).close()
+        os.replace(replacement, path)
+        self.assertFalse(is_healthy(wrapper))
+
+
+@override_settings(DATABASE_RETRY_DELAY=0)
+class RetryOnLockTests(SimpleTestCase):
+    def make_view(self, *errors):
+        calls = []
+        errors = list(errors)
+
+        @retry_on_lock
+        def view(request):
+            calls.append(request)
+            if errors:
+                raise errors.pop(0)
+            return HttpResponse('ok')
+        return view, calls
+
+    def test_lock_retried(self):
+        """ «database is locked» повторяется, пока не пройдёт. """
+        locked = OperationalError('database is locked')
+        view, calls = self.make_view(locked, locked)
+        response = view(RequestFactory().post('/'))
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(len(calls), 3)
+
+    @override_settings(DATABASE_RETRY_ATTEMPTS=2)
+    def test_other_errors_and_exhausted_attempts(self):
+        """ Прочие ошибки и последняя неудачная попытка пробрасываются. """
+        cases = (
+            ([OperationalError('no such table: x')], 1),
+            ([OperationalError('database is locked')] * 3, 2),
+        )
+        for errors, expected_calls in cases:
+            with self.subTest(error=str(errors[0])):
+                view, calls = self.make_view(*errors)
+                with self.assertRaises(OperationalError):
+                    view(RequestFactory().post('/'))
+                self.assertEqual(len(calls), expected_calls)
+
+
+class RetryInTransactionTests(TestCase):
+    @override_settings(DATABASE_RETRY_DELAY=0)
+    def test_not_retried_inside_transaction(self):
+        """ Внутри транзакции повтор невозможен: ошибка сразу наружу. """
+        calls = []
+
+        @retry_on_lock
+        def view(request):
+            calls.append(request)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            view(RequestFactory().post('/'))
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(REPLICA_STICKY_SECONDS=15)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            'core.routers.replica_aliases', return_value=['replica'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route(self, cookie=None):
+        request = RequestFactory().get('/')
+        if cookie is not None:
+            request.COOKIES['read_primary_until'] = cookie
+
+        @read_from_replica
+        def view(request):
+            return router.db_for_read(User), router.db_for_write(User)
+        return view(request)
+
+    def test_read_only_views_read_replica(self):
+        """ В read_from_replica чтение из реплики, запись — в default. """
+        self.assertEqual(self.route(), ('replica', 'default'))
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_recent_writer_reads_primary(self):
+        """ До истечения cookie после записи чтение идёт из default. """
+        cases = (
+            (f'{time.time() + 10}', 'default'),
+            (f'{time.time() - 1}', 'replica'),
+            ('garbage', 'replica'),
+        )
+        for cookie, alias in cases:
+            with self.subTest(cookie=cookie):
+                self.assertEqual(self.route(cookie)[0], alias)
+
+    def test_one_replica_per_view(self):
+        """ Все чтения одного view идут в одну реплику. """
+        @read_from_replica
+        def view(request):
+            return {router.db_for_read(User) for _ in range(20)}
+
+        with mock.patch('core.routers.replica_aliases',
+                        return_value=['replica', 'replica_2']):
+            aliases = view(RequestFactory().get('/'))
+        self.assertEqual(len(aliases), 1)
+
+    def test_replica_cache_timeout(self):
+        """ Прочитанное из реплики кэшируется не дольше окна отставания. """
+        self.assertEqual(cache_timeout(600, 'default'), 600)
+        self.assertEqual(cache_timeout(600, 'replica'), 15)
+        self.assertEqual(cache_timeout(None, 'replica'), 15)
+        self.assertEqual(cache_timeout(5, 'replica'), 5)
+
+    def test_migrations_only_on_primary(self):
+        """ Схему реплики получают копированием, а не миграциями. """
+        self.assertTrue(ReplicaRouter().allow_migrate('default', 'posts'))
+        self.assertFalse(ReplicaRouter().allow_migrate('replica', 'posts'))
+
+
+class ReplicaTests(TestCase):
+    def test_mirror_replica_not_used(self):
+        """ Реплика-зеркало default (TEST MIRROR) не используется. """
+        self.assertEqual(replica_aliases(), [])
+        with self.assertRaises(CommandError):
+            call_command('sync_replicas')
+
+    def test_copy_database(self):
+        """ Копия файловой базы содержит её данные. """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary = type(connections['default'])({
+            **connection.settings_dict,
+            'NAME': os.path.join(directory, 'db.sqlite3'),
+        }, alias='primary')
+        self.addCleanup(primary.close)
+        with primary.cursor() as cursor:
+            cursor.execute('CREATE TABLE note (text TEXT)')
+            cursor.execute("INSERT INTO note VALUES ('replicated')")
+        path = os.path.join(directory, 'replica.sqlite3')
+        copy_database(primary, path)
+        with sqlite3.connect(path) as replica:
+            rows = replica.execute('SELECT text FROM note').fetchall()
+        self.assertEqual(rows, [('replicated',)])
+
+
+@override_settings(REPLICA_STICKY_SECONDS=15)
+class ReadPrimaryAfterWriteTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='writer'))
+        self.author = User.objects.create_user(username='author')
+
+    def test_write_sets_read_primary_cookie(self):
+        """ После записи ставится cookie чтения из default, после
+        чтения — нет. """
+        response = self.client.get('/')
+        self.assertNotIn('read_primary_until', response.cookies)
+        response = self.client.post('/create/', {'text': 'Новый пост'})
+        cookie = response.cookies['read_primary_until']
+        self.assertEqual(cookie['max-age'], 15)
+        self.assertAlmostEqual(
+            float(cookie.value), time.time() + 15, delta=5)
+
+    def test_get_follow_sets_read_primary_cookie(self):
+        """ Подписка GET-запросом тоже ставит cookie. """
+        response = self.client.get('/profile/author/follow/')
+        self.assertIn('read_primary_until', response.cookies)
+
+    def test_rolled_back_write_sets_no_cookie(self):
+        """ Откаченная запись cookie не ставит. """
+        def view(request):
+            try:
+                with transaction.atomic():
+                    User.objects.create_user(username='ghost')
+                    raise ValueError
+            except ValueError:
+                return HttpResponse()
+
+        middleware = ReadPrimaryAfterWriteMiddleware(view)
+        response = middleware(RequestFactory().post('/'))
+        self.assertNotIn('read_primary_until', response.cookies)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .search import filter_matching, fts_enabled, terms
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +17,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексу FTS5 вместо LIKE '%...%', если он есть."""
+        if not search_term or not fts_enabled(queryset.db):
+            return super().get_search_results(
+                request, queryset, search_term)
+        if not terms(search_term):
+            return queryset.none(), False
+        return filter_matching(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,38 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'posts:version:{}'
+
+
+def get_version(name):
+    """Текущая версия набора данных name (метка времени изменения).
+
+    Если ключ вытеснен из кэша, версия начинается заново с текущего
+    момента, поэтому старые закэшированные значения не оживают.
+    """
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key, time.time())
+    return version
+
+
+def _bump(name):
+    key = VERSION_KEY.format(name)
+    previous = cache.get(key) or 0
+    cache.set(key, max(time.time(), previous + 0.000001), None)
+
+
+def bump_version(name):
+    """Объявляет все значения, зависящие от name, устаревшими.
+
+    Внутри транзакции версия сдвигается ещё раз после коммита: читатель,
+    успевший до коммита закэшировать старые строки под новой версией,
+    иначе отдавал бы их до истечения кэша.
+    """
+    _bump(name)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(name))
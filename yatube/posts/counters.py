@@ -0,0 +1,53 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import bump_version
+from .models import Comment, Follow, Post, User, UserStats
+from .revisions import bump_revision
+
+
+def change_user_stats(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя на deltas."""
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount_user_stats(users=None):
+    """Пересчитывает счётчики пользователей с нуля."""
+    users = User.objects.all() if users is None else users
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in users.filter(
+            stats__isnull=True).values_list('pk', flat=True)),
+        ignore_conflicts=True
+    )
+    updated = UserStats.objects.filter(user__in=users.values('pk')).update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+    bump_version('profiles')
+    return updated
+
+
+def recount_comments(posts=None):
+    """Пересчитывает количество комментариев у постов."""
+    posts = Post.objects.all() if posts is None else posts
+    updated = posts.update(
+        comments_count=_count(Comment.objects.all(), 'post'))
+    bump_version('comments')
+    bump_revision('comments')
+    return updated
@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from .following import following_ids
+from .models import FeedItem, Follow, Post, UserStats
+from .utils import pagination
+
+INBOX_ORDERING = ('-pub_date', '-post_id')
+
+
+def followers_count(author_id):
+    return UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+
+
+def is_pull_author(author_id):
+    """Авторов с огромным числом подписчиков в ленты не раскладываем."""
+    return followers_count(author_id) > settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def _bulk_insert(items):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= settings.FEED_BATCH_SIZE:
+            FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    if is_pull_author(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator()
+    _bulk_insert(
+        FeedItem(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in follower_ids
+    )
+
+
+def backfill_inbox(user_id, author_id):
+    """Переносит посты автора в ленту нового подписчика."""
+    if is_pull_author(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date').iterator()
+    _bulk_insert(
+        FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def trim_inbox(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    FeedItem.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def author_unfollowed(author_id):
+    """Раскладывает посты автора, который перестал быть pull-автором.
+
+    Пока подписчиков было больше FEED_FANOUT_MAX_FOLLOWERS, новые
+    посты в ленты не попадали; как только их снова стало не больше
+    порога, лента читается только из FeedItem и без раскладки эти
+    посты пропали бы.
+    """
+    if followers_count(author_id) == settings.FEED_FANOUT_MAX_FOLLOWERS:
+        rebuild_inboxes(author_id)
+
+
+def rebuild_inboxes(author_id=None):
+    """Заполняет ленты подписчиков одним INSERT ... SELECT.
+
+    Нужен после массовой загрузки, когда сигналы не срабатывали, и
+    для автора, вернувшегося под порог раскладки (author_id); уже
+    разложенные записи пропускаются, pull-авторы не раскладываются.
+    """
+    connection = connections[FeedItem.objects.db]
+    select = (
+        'SELECT follow.user_id, post.id, post.pub_date '
+        f'FROM {Follow._meta.db_table} AS follow '
+        f'JOIN {Post._meta.db_table} AS post '
+        'ON post.author_id = follow.author_id '
+        f'LEFT JOIN {UserStats._meta.db_table} AS stats '
+        'ON stats.user_id = follow.author_id '
+        'WHERE COALESCE(stats.followers_count, 0) <= %s'
+    )
+    params = [settings.FEED_FANOUT_MAX_FOLLOWERS]
+    if author_id is not None:
+        select += ' AND follow.author_id = %s'
+        params.append(author_id)
+    columns = f'{FeedItem._meta.db_table} (user_id, post_id, pub_date)'
+    if connection.vendor == 'sqlite':
+        sql = f'INSERT OR IGNORE INTO {columns} {select}'
+    else:
+        sql = f'INSERT INTO {columns} {select} ON CONFLICT DO NOTHING'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def pull_author_ids(user):
+    """Авторы из подписок, чьи посты читаются напрямую из Post.
+
+    Подписки берутся из кэша (following_ids): без них запроса нет,
+    при небольшом числе подписок не нужен JOIN с Follow.
+    """
+    ids = following_ids(user)
+    if not ids:
+        return []
+    if len(ids) <= settings.FEED_PULL_LOOKUP_MAX:
+        return list(UserStats.objects.filter(
+            user_id__in=ids.tolist(),
+            followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).order_by().values_list('user_id', flat=True))
+    return list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).order_by().values_list('author_id', flat=True))
+
+
+def follow_feed(user, pull_ids=None):
+    """Лента подписок: материализованная лента плюс pull-авторы."""
+    condition = Q(pk__in=FeedItem.objects.filter(
+        user=user).values('post_id'))
+    if pull_ids is None:
+        pull_ids = pull_author_ids(user)
+    if pull_ids:
+        condition |= Q(author_id__in=pull_ids)
+    return Post.objects.filter(condition)
+
+
+def follow_feed_page(request):
+    """Контекст страницы ленты подписок.
+
+    Без pull-авторов страница читается диапазоном по индексу
+    (user, -pub_date, -post) таблицы FeedItem, после чего посты
+    подгружаются по первичному ключу.
+    """
+    pull_ids = pull_author_ids(request.user)
+    if pull_ids:
+        return pagination(
+            follow_feed(request.user, pull_ids).for_feed(), request)
+    context = pagination(
+        FeedItem.objects.filter(user=request.user).only('pub_date', 'post'),
+        request,
+        ordering=INBOX_ORDERING
+    )
+    page_obj = context['page_obj']
+    post_ids = [item.post_id for item in page_obj.object_list]
+    posts = Post.objects.for_feed().in_bulk(post_ids)
+    page_obj.object_list = [
+        posts[post_id] for post_id in post_ids if post_id in posts
+    ]
+    return context
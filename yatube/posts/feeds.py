@@ -0,0 +1,207 @@
+from collections import namedtuple
+from io import StringIO
+from itertools import chain, islice
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import (Atom1Feed, Rss201rev2Feed,
+                                        SimplerXMLGenerator)
+from django.utils.text import Truncator
+from django.views.decorators.http import condition
+
+from core.metrics import record_cache
+from core.routers import cache_timeout, read_from_replica
+
+from .cache import get_version
+from .models import Group, Post, User
+from .revisions import get_revisions
+
+FeedSource = namedtuple('FeedSource', 'title link description posts')
+
+
+class StreamingFeedMixin:
+    """Генератор ленты, который пишет XML частями.
+
+    Заголовок и закрывающие теги берутся из документа без записей,
+    а записи сериализуются пачками тем же write_items.
+    """
+
+    closing_tag = None
+    updated = None
+
+    def latest_post_date(self):
+        return self.updated or super().latest_post_date()
+
+    def envelope(self):
+        self.items = []
+        output = StringIO()
+        self.write(output, 'utf-8')
+        document = output.getvalue()
+        split = document.rindex(self.closing_tag)
+        return document[:split], document[split:]
+
+    def serialize_items(self, items):
+        self.items = items
+        output = StringIO()
+        self.write_items(SimplerXMLGenerator(output, 'utf-8'))
+        self.items = []
+        return output.getvalue()
+
+
+class StreamingRssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    closing_tag = '</channel>'
+
+
+class StreamingAtomFeed(StreamingFeedMixin, Atom1Feed):
+    closing_tag = '</feed>'
+
+
+class PostsFeed(Feed):
+    """RSS/Atom последних постов: общая лента, группа или автор.
+
+    Записи читаются через QuerySet.iterator() и отдаются
+    StreamingHttpResponse пачками по SYNDICATION_CHUNK_SIZE; готовый
+    документ кэшируется до смены версии 'listing'.
+    """
+
+    feed_type = StreamingRssFeed
+
+    def __call__(self, request, **kwargs):
+        source = self.get_object(request, **kwargs)
+        # В документе абсолютные ссылки, поэтому в ключе схема и хост
+        key = (
+            f'posts:feed:{get_version("listing")}:{request.scheme}:'
+            f'{request.get_host()}:{self.key(**kwargs)}'
+        )
+        content_type = self.feed_type.content_type
+        content = cache.get(key)
+        record_cache('feed', content is not None)
+        if content is not None:
+            return HttpResponse(content, content_type=content_type)
+        # Записи читаются уже после выхода из view: база выбирается сейчас
+        source = source._replace(posts=source.posts.using(source.posts.db))
+        feed = self.get_feed(source, request)
+        return StreamingHttpResponse(
+            self.stream(feed, source, request, key),
+            content_type=content_type
+        )
+
+    def key(self, slug=None, username=None):
+        feed_format = (
+            'atom' if issubclass(self.feed_type, Atom1Feed) else 'rss')
+        if slug is not None:
+            return f'group:{slug}:{feed_format}'
+        if username is not None:
+            return f'profile:{username}:{feed_format}'
+        return f'index:{feed_format}'
+
+    def get_object(self, request, slug=None, username=None):
+        posts = Post.objects.for_feed()
+        if slug is not None:
+            group = get_object_or_404(Group, slug=slug)
+            return FeedSource(
+                title=f'Yatube: {group.title}',
+                link=reverse('posts:group_lists', args=[slug]),
+                description=group.description,
+                posts=posts.filter(group=group),
+            )
+        if username is not None:
+            author = get_object_or_404(User, username=username)
+            return FeedSource(
+                title=f'Yatube: {author.get_full_name() or username}',
+                link=reverse('posts:profile', args=[username]),
+                description=f'Записи пользователя {username}',
+                posts=posts.filter(author=author),
+            )
+        return FeedSource(
+            title='Yatube',
+            link=reverse('posts:index'),
+            description='Последние обновления на сайте',
+            posts=posts,
+        )
+
+    def title(self, source):
+        return source.title
+
+    def link(self, source):
+        return source.link
+
+    def description(self, source):
+        return source.description
+
+    def items(self, source):
+        # Записи добавляет stream(), в get_feed только заголовок ленты
+        return []
+
+    def item_kwargs(self, post, request):
+        link = request.build_absolute_uri(
+            reverse('posts:post_detail', args=[post.pk]))
+        author = post.author
+        return {
+            'title': Truncator(post.text).words(10),
+            'link': link,
+            'unique_id': link,
+            'description': post.text,
+            'pubdate': post.pub_date,
+            'author_name': author.get_full_name() or author.username,
+            'author_link': request.build_absolute_uri(
+                reverse('posts:profile', args=[author.username])),
+            'categories': (post.group.title,) if post.group else (),
+        }
+
+    def stream(self, feed, source, request, key):
+        posts = source.posts[:settings.SYNDICATION_ITEMS].iterator(
+            chunk_size=settings.SYNDICATION_CHUNK_SIZE)
+        first = next(posts, None)
+        feed.updated = first.pub_date if first else None
+        posts = chain([first], posts) if first else posts
+        scratch = self.feed_type('', '', '')
+        head, tail = feed.envelope()
+        chunks = [head]
+        yield head
+        while True:
+            batch = list(islice(posts, settings.SYNDICATION_CHUNK_SIZE))
+            if not batch:
+                break
+            items = []
+            for post in batch:
+                scratch.add_item(**self.item_kwargs(post, request))
+                items.append(scratch.items.pop())
+            chunk = feed.serialize_items(items)
+            chunks.append(chunk)
+            yield chunk
+        chunks.append(tail)
+        yield tail
+        cache.set(key, ''.join(chunks), cache_timeout(
+            settings.SYNDICATION_CACHE_TIMEOUT, source.posts.db))
+
+
+class AtomPostsFeed(PostsFeed):
+    feed_type = StreamingAtomFeed
+    subtitle = PostsFeed.description
+
+
+def feed_view(feed_class):
+    """View ленты с ETag и Last-Modified по ревизии 'listing'.
+
+    Лента не зависит от зрителя, поэтому оба заголовка общие.
+    """
+    feed = feed_class()
+
+    def etag(request, **kwargs):
+        value, _ = get_revisions(request, 'listing')['listing']
+        return f'{value}-{feed.key(**kwargs)}'
+
+    def last_modified(request, **kwargs):
+        return get_revisions(request, 'listing')['listing'][1]
+
+    return read_from_replica(condition(
+        etag_func=etag, last_modified_func=last_modified)(feed))
+
+
+rss_feed = feed_view(PostsFeed)
+atom_feed = feed_view(AtomPostsFeed)
@@ -0,0 +1,91 @@
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.metrics import record_cache
+from core.routers import cache_timeout
+
+from .models import Follow
+
+FOLLOWING_KEY = 'posts:following:{}'
+
+
+def _load(user_id):
+    """Массив подписок из БД и алиас базы, из которой он прочитан."""
+    queryset = Follow.objects.filter(user_id=user_id).order_by(
+        'author_id').values_list('author_id', flat=True)
+    return array('l', queryset.iterator()), queryset.db
+
+
+def _cached(user_id):
+    data = cache.get(FOLLOWING_KEY.format(user_id))
+    if data is None:
+        return None
+    ids = array('l')
+    ids.frombytes(data)
+    return ids
+
+
+def _store(user_id, ids, timeout=None):
+    cache.set(
+        FOLLOWING_KEY.format(user_id),
+        ids.tobytes(),
+        settings.FOLLOWING_CACHE_TIMEOUT if timeout is None else timeout
+    )
+
+
+def following_ids(user):
+    """Отсортированный массив id авторов, на которых подписан user.
+
+    Хранится в кэше байтами array('l') и запоминается на объекте
+    пользователя, так что за запрос читается не больше одного раза.
+    """
+    if not user.is_authenticated:
+        return array('l')
+    ids = getattr(user, '_following_ids', None)
+    if ids is not None:
+        return ids
+    ids = _cached(user.pk)
+    record_cache('following', ids is not None)
+    if ids is None:
+        ids, using = _load(user.pk)
+        _store(user.pk, ids, cache_timeout(
+            settings.FOLLOWING_CACHE_TIMEOUT, using))
+    user._following_ids = ids
+    return ids
+
+
+def is_following(user, author):
+    """Подписан ли user на author (объект или id) — без запросов к БД."""
+    author_id = getattr(author, 'pk', author)
+    ids = following_ids(user)
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def follow_changed(user_id, author_id, add):
+    """Правит закэшированный массив после коммита подписки или отписки.
+
+    При откате кэш не меняется. Правка идемпотентна, так что массив,
+    перечитанный другим запросом до коммита, она тоже исправит. Если
+    массива в кэше нет, его загрузит следующий following_ids.
+    """
+    transaction.on_commit(lambda: _patch(user_id, author_id, add))
+
+
+def _patch(user_id, author_id, add):
+    ids = _cached(user_id)
+    if ids is None:
+        return
+    index = bisect_left(ids, author_id)
+    present = index < len(ids) and ids[index] == author_id
+    if add and not present:
+        ids.insert(index, author_id)
+    elif not add and present:
+        ids.pop(index)
+    else:
+        return
+    _store(user_id, ids)
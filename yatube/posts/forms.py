@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import ingest_image
 from .models import Comment, Post
 
 
@@ -13,6 +15,12 @@ class PostForm(forms.ModelForm):
             'Выберите группу, если желаете 🙂'
         )
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return ingest_image(image)
+        return image
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
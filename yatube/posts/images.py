@@ -0,0 +1,116 @@
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageFilter, ImageOps
+
+# Формат Pillow: расширение и параметры сохранения
+FORMATS = {
+    'JPEG': ('jpg', {'optimize': True, 'progressive': True}),
+    'PNG': ('png', {'optimize': True}),
+    'GIF': ('gif', {}),
+    'WEBP': ('webp', {'method': 4}),
+}
+
+# Метаданные, без которых картинка выглядит иначе; остальное (EXIF
+# с геометкой и т. п.) при пересохранении отбрасывается
+KEPT_INFO = ('transparency', 'icc_profile')
+
+
+def _target_size(size, max_side):
+    width, height = size
+    scale = min(1, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode(image, image_format):
+    extension, options = FORMATS[image_format]
+    if image_format in ('JPEG', 'WEBP'):
+        options = {**options, 'quality': settings.POST_IMAGE_QUALITY}
+    if image.info.get('icc_profile'):
+        # JPEG и WebP берут профиль только из параметров save
+        options = {**options, 'icc_profile': image.info['icc_profile']}
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, image_format, **options)
+    return extension, output.getvalue()
+
+
+def ingest_image(upload):
+    """Проверяет загруженную картинку и сохраняет её уменьшенную копию.
+
+    По заголовку, без декодирования, проверяются формат и число
+    пикселей. JPEG затем декодируется в режиме draft сразу в
+    уменьшенном в 2–8 раз масштабе, поэтому память на загрузку
+    ограничена POST_IMAGE_MAX_DECODED_PIXELS, а не размером фото.
+    Картинка ужимается до POST_IMAGE_MAX_SIZE по длинной стороне,
+    поворачивается по EXIF и пересохраняется без метаданных, кроме
+    прозрачности и цветового профиля.
+    Анимации только проверяются и сохраняются как есть.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image')
+    if image.format not in FORMATS:
+        raise ValidationError(
+            'Поддерживаются только JPEG, PNG, GIF и WebP.',
+            code='image_format')
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Слишком большое изображение: {width}×{height}.',
+            code='image_size')
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    max_side = settings.POST_IMAGE_MAX_SIZE
+    image_format = image.format
+    image.draft(None, _target_size(image.size, max_side))
+    decoded_width, decoded_height = image.size
+    if decoded_width * decoded_height > (
+            settings.POST_IMAGE_MAX_DECODED_PIXELS):
+        raise ValidationError(
+            f'Слишком большое изображение: {width}×{height}.',
+            code='image_size')
+    try:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        image = ImageOps.exif_transpose(image)
+    except OSError:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image')
+    image.info = {
+        key: image.info[key] for key in KEPT_INFO if key in image.info}
+    extension, content = _encode(image, image_format)
+    stem = os.path.splitext(os.path.basename(upload.name))[0] or 'image'
+    return ContentFile(content, name=f'{stem}.{extension}')
+
+
+def describe_image(file_):
+    """Размеры картинки и крошечная размытая копия для первой отрисовки.
+
+    Копия обрезается по пропорциям карточки (POST_CARD_IMAGE_SIZE),
+    ужимается до POST_PLACEHOLDER_WIDTH пикселей и отдаётся как
+    data: URI в JPEG — несколько сотен байт.
+    """
+    card_width, card_height = settings.POST_CARD_IMAGE_SIZE
+    width = settings.POST_PLACEHOLDER_WIDTH
+    size = (width, max(1, round(width * card_height / card_width)))
+    file_.seek(0)
+    with Image.open(file_) as image:
+        dimensions = image.size
+        image.draft('RGB', size)
+        preview = ImageOps.fit(image.convert('RGB'), size, Image.BILINEAR)
+    file_.seek(0)
+    output = BytesIO()
+    preview.filter(ImageFilter.GaussianBlur(1)).save(
+        output, 'JPEG', quality=settings.POST_PLACEHOLDER_QUALITY,
+        optimize=True)
+    encoded = base64.b64encode(output.getvalue()).decode()
+    return dimensions, f'data:image/jpeg;base64,{encoded}'
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_comments, recount_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def handle(self, *args, **options):
+        users = recount_user_stats()
+        posts = recount_comments()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: пользователей {users}, постов {posts}.'
+        ))
@@ -0,0 +1,250 @@
+import random
+import time
+from array import array
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.cache import bump_version
+from posts.counters import recount_comments, recount_user_stats
+from posts.feed import rebuild_inboxes
+from posts.models import Comment, Follow, Group, Post, User
+from posts.revisions import bump_revision
+
+WORDS = (
+    'утро вечер туман река город дорога лес поле снег дождь солнце ветер '
+    'книга письмо поезд море берег окно кофе музыка работа отпуск друг '
+    'кот собака дом сад весна лето осень зима новости проект код ошибка '
+    'релиз тест база запрос страница лента подписка автор группа фото '
+    'сегодня завтра вчера снова опять наконец почему когда где очень'
+).split()
+
+
+# Точка отсчёта дат по умолчанию: с ней вывод зависит только от --seed
+EPOCH = '2024-01-01T00:00:00+00:00'
+
+
+def aware_datetime(value):
+    """Тип аргумента --now: ISO 8601, без зоны — UTC."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил свои даты."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class PowerLaw:
+    """Выбор индекса 0..size-1 с весами 1 / (rank ** exponent).
+
+    Ранги перемешаны генератором, поэтому «звёзды» — случайные
+    записи, а не первые созданные. Память — O(size).
+    """
+
+    def __init__(self, rng, size, exponent):
+        self.rng = rng
+        self.ranks = array('l', range(size))
+        rng.shuffle(self.ranks)
+        self.cum_weights = array('d', accumulate(
+            1 / (rank ** exponent) for rank in range(1, size + 1)))
+
+    def __call__(self):
+        total = self.cum_weights[-1]
+        index = bisect(self.cum_weights, self.rng.random() * total)
+        return self.ranks[min(index, len(self.ranks) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками со степенным распределением '
+        'активности. Результат детерминирован значением --seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона для авторов и подписок.')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument(
+            '--now', type=aware_datetime, default=aware_datetime(EPOCH),
+            help='Конец интервала дат (ISO 8601), по умолчанию '
+                 f'{EPOCH}.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='seed')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.prefix = options['prefix']
+        if User.objects.filter(
+                username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом «{self.prefix}» уже есть, '
+                f'укажите другой --prefix.')
+        self.now = options['now']
+        self.start = self.now - timedelta(days=options['days'])
+        self.span = (self.now - self.start).total_seconds()
+
+        user_ids = self.step('users', self.create_users)
+        group_ids = self.step('groups', self.create_groups)
+        self.step('posts', self.create_posts, user_ids, group_ids)
+        post_ids, post_dates = self.post_index()
+        self.step('comments', self.create_comments, user_ids,
+                  post_ids, post_dates)
+        self.step('follows', self.create_follows, user_ids)
+        self.step('counters', lambda: (
+            recount_user_stats(), recount_comments()))
+        self.step('inboxes', rebuild_inboxes)
+        bump_version('posts')
+        bump_version('listing')
+        bump_revision('listing')
+        bump_revision('comments')
+        self.stdout.write(self.style.SUCCESS('Готово.'))
+
+    def step(self, name, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        if self.options['verbosity']:
+            self.stdout.write(
+                f'{name}: {time.monotonic() - started:.1f} с')
+        return result
+
+    def bulk_create(self, model, objects, **kwargs):
+        """Пишет объекты из генератора пачками, не держа их в памяти."""
+        size = self.options['batch_size']
+        objects = iter(objects)
+        while True:
+            batch = list(islice(objects, size))
+            if not batch:
+                break
+            model.objects.bulk_create(batch, **kwargs)
+
+    def ids(self, queryset):
+        return array('l', queryset.order_by('pk').values_list(
+            'pk', flat=True).iterator())
+
+    def random_date(self):
+        return self.start + timedelta(seconds=self.rng.random() * self.span)
+
+    def text(self, low, high):
+        return ' '.join(
+            self.rng.choice(WORDS)
+            for _ in range(self.rng.randint(low, high))
+        ).capitalize()
+
+    def create_users(self):
+        password = make_password(self.prefix)
+        self.bulk_create(User, (
+            User(
+                username=f'{self.prefix}_{number}',
+                password=password,
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                date_joined=self.start,
+            )
+            for number in range(self.options['users'])
+        ))
+        return self.ids(User.objects.filter(
+            username__startswith=f'{self.prefix}_'))
+
+    def create_groups(self):
+        self.bulk_create(Group, (
+            Group(
+                title=f'Группа {self.prefix} {number}',
+                slug=f'{self.prefix}-{number}',
+                description=self.text(5, 20),
+            )
+            for number in range(self.options['groups'])
+        ))
+        return self.ids(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-'))
+
+    def create_posts(self, user_ids, group_ids):
+        author = PowerLaw(self.rng, len(user_ids), self.options['exponent'])
+        group = group_ids and PowerLaw(
+            self.rng, len(group_ids), self.options['exponent'])
+        pub_date = Post._meta.get_field('pub_date')
+        with manual_dates(pub_date):
+            self.bulk_create(Post, (
+                Post(
+                    author_id=user_ids[author()],
+                    group_id=(
+                        group_ids[group()]
+                        if group and self.rng.random() < 0.7 else None
+                    ),
+                    text=self.text(3, 60),
+                    pub_date=self.random_date(),
+                )
+                for _ in range(self.options['posts'])
+            ))
+
+    def post_index(self):
+        """id и даты новых постов для комментариев (два плоских массива)."""
+        post_ids, post_dates = array('l'), array('d')
+        users = User.objects.filter(username__startswith=f'{self.prefix}_')
+        for pk, pub_date in Post.objects.filter(author__in=users).order_by(
+                'pk').values_list('pk', 'pub_date').iterator():
+            post_ids.append(pk)
+            post_dates.append(pub_date.timestamp())
+        return post_ids, post_dates
+
+    def create_comments(self, user_ids, post_ids, post_dates):
+        if not post_ids:
+            return
+        post = PowerLaw(self.rng, len(post_ids), self.options['exponent'])
+        now = self.now.timestamp()
+        created = Comment._meta.get_field('created')
+
+        def comments():
+            for _ in range(self.options['comments']):
+                index = post()
+                timestamp = min(
+                    now, post_dates[index] + self.rng.expovariate(1 / 3600))
+                yield Comment(
+                    post_id=post_ids[index],
+                    author_id=self.rng.choice(user_ids),
+                    text=self.text(1, 25),
+                    created=datetime.fromtimestamp(timestamp, tz=timezone.utc),
+                )
+
+        with manual_dates(created):
+            self.bulk_create(Comment, comments())
+
+    def create_follows(self, user_ids):
+        author = PowerLaw(self.rng, len(user_ids), self.options['exponent'])
+
+        def follows():
+            for _ in range(self.options['follows']):
+                user_id = self.rng.choice(user_ids)
+                author_id = user_ids[author()]
+                if user_id != author_id:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.bulk_create(Follow, follows(), ignore_conflicts=True)
@@ -0,0 +1,51 @@
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import F
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post, StoredFile
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    """Отмечает ещё одну ссылку на файл name."""
+    if not name:
+        return
+    updated = StoredFile.objects.filter(name=name).update(
+        refcount=F('refcount') + 1)
+    if not updated:
+        _, created = StoredFile.objects.get_or_create(
+            name=name, defaults={'refcount': 1})
+        if not created:
+            acquire(name)
+
+
+def release(name):
+    """Снимает ссылку; последний файл удаляется вместе с миниатюрами.
+
+    Удаление откладывается до коммита и перепроверяется: файл могли
+    загрузить заново. Файлы без учёта ссылок не трогаются.
+    """
+    if not name:
+        return
+    StoredFile.objects.filter(name=name).update(
+        refcount=F('refcount') - 1)
+    deleted, _ = StoredFile.objects.filter(
+        name=name, refcount__lte=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: delete_unused(name))
+
+
+def delete_unused(name):
+    if StoredFile.objects.filter(name=name).exists():
+        return
+    image = ImageFile(name, Post._meta.get_field('image').storage)
+    delete(image, delete_file=False)
+    try:
+        image.delete()
+    except (OSError, SuspiciousFileOperation):
+        logger.exception('Не удалось удалить файл %s', name)
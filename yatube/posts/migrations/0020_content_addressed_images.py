@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:38
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def count_references(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredFile = apps.get_model('posts', 'StoredFile')
+    rows = Post.objects.exclude(image='').order_by().values(
+        'image').annotate(total=Count('pk')).values_list('image', 'total')
+    StoredFile.objects.bulk_create(
+        StoredFile(name=name, refcount=total)
+        for name, total in rows.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+            },
+        ),
+        # Хранилище не влияет на схему, а пересоздание таблицы в SQLite
+        # удалило бы триггеры полнотекстового индекса (0019)
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:42
+
+import base64
+from importlib import import_module
+from io import BytesIO
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import migrations, models
+from PIL import Image, ImageFilter, ImageOps
+
+fts = import_module('posts.migrations.0019_post_fts')
+
+# Копия posts.images.describe_image на момент миграции с тогдашними
+# настройками: POST_CARD_IMAGE_SIZE, POST_PLACEHOLDER_WIDTH и _QUALITY
+CARD_SIZE = (960, 339)
+PLACEHOLDER_WIDTH = 32
+PLACEHOLDER_QUALITY = 40
+
+
+def describe_image(file_):
+    card_width, card_height = CARD_SIZE
+    size = (
+        PLACEHOLDER_WIDTH,
+        max(1, round(PLACEHOLDER_WIDTH * card_height / card_width))
+    )
+    file_.seek(0)
+    with Image.open(file_) as image:
+        dimensions = image.size
+        image.draft('RGB', size)
+        preview = ImageOps.fit(image.convert('RGB'), size, Image.BILINEAR)
+    file_.seek(0)
+    output = BytesIO()
+    preview.filter(ImageFilter.GaussianBlur(1)).save(
+        output, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    encoded = base64.b64encode(output.getvalue()).decode()
+    return dimensions, f'data:image/jpeg;base64,{encoded}'
+
+
+def restore_fts(apps, schema_editor):
+    """SQLite пересоздаёт posts_post при изменении полей, теряя триггеры."""
+    fts.drop_fts(apps, schema_editor)
+    fts.create_fts(apps, schema_editor)
+
+
+def describe_images(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    for post in Post.objects.exclude(image='').iterator():
+        try:
+            dimensions, placeholder = describe_image(post.image)
+        except (OSError, ValueError, SuspiciousFileOperation,
+                Image.DecompressionBombError):
+            continue
+        finally:
+            post.image.close()
+        Post.objects.filter(pk=post.pk).update(
+            image_width=dimensions[0],
+            image_height=dimensions[1],
+            image_placeholder=placeholder,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_fts),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Заглушка картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.RunPython(restore_fts, migrations.RunPython.noop),
+        migrations.RunPython(describe_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Revision',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Набор данных')),
+                ('value', models.PositiveIntegerField(default=0, verbose_name='Номер')),
+                ('changed', models.DateTimeField(null=True, verbose_name='Изменён')),
+            ],
+            options={
+                'verbose_name': 'Ревизия',
+                'verbose_name_plural': 'Ревизии',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:21
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+fts = import_module('posts.migrations.0019_post_fts')
+
+
+def restore_fts(apps, schema_editor):
+    """SQLite пересоздаёт posts_post при изменении полей, теряя триггеры."""
+    fts.drop_fts(apps, schema_editor)
+    fts.create_fts(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_revision'),
+    ]
+
+    # Поле заполнит thumbnails.generate при первой отрисовке поста
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_fts),
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.TextField(blank=True, editable=False, verbose_name='Варианты картинки'),
+        ),
+        migrations.RunPython(restore_fts, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -13,6 +15,30 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    FEED_FIELDS = (
+        'text',
+        'pub_date',
+        'image',
+        'image_width',
+        'image_height',
+        'image_placeholder',
+        'image_variants',
+        'author',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'group',
+        'group__title',
+        'group__slug',
+        'comments_count',
+    )
+
+    def for_feed(self):
+        """Только то, что нужно карточке поста, одним запросом."""
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -31,16 +57,58 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False)
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False)
+    # JSON {формат: [[ширина, имя файла], ...]} от thumbnails.generate
+    image_variants = models.TextField(
+        'Варианты картинки', blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
 
 
+class CommentQuerySet(models.QuerySet):
+    THREAD_FIELDS = (
+        'post',
+        'text',
+        'created',
+        'author',
+        'author__username',
+    )
+
+    def for_thread(self):
+        """Комментарии с авторами для страницы поста одним запросом."""
+        return self.select_related('author').only(*self.THREAD_FIELDS)
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -60,6 +128,14 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = (models.Index(
+            fields=['post', 'created', 'id'],
+            name='comment_post_created_idx'),
+        )
+
     def __str__(self):
         return self.text[:15]
 
@@ -84,3 +160,84 @@ class Follow(models.Model):
             fields=['author', 'user'],
             name='unique_follow'),
         )
+        indexes = (models.Index(
+            fields=['user', 'author'],
+            name='follow_user_author_idx'),
+        )
+
+
+class FeedItem(models.Model):
+    """Запись в ленте подписок пользователя (fan-out on write)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = (models.UniqueConstraint(
+            fields=['user', 'post'],
+            name='unique_feed_item'),
+        )
+        indexes = (models.Index(
+            fields=['user', '-pub_date', '-post'],
+            name='feed_item_user_date_idx'),
+        )
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, поддерживаемые сигналами (см. counters)."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self):
+        return f'Счётчики {self.user_id}'
+
+
+class StoredFile(models.Model):
+    """Картинка в хранилище и число постов, которые на неё ссылаются."""
+    name = models.CharField('Имя файла', max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+class Revision(models.Model):
+    """Номер изменения набора данных для ETag и Last-Modified.
+
+    Сдвигается в той же транзакции, что и сами данные (см. revisions),
+    поэтому одинаков во всех процессах, а на реплике соответствует
+    её строкам.
+    """
+    name = models.CharField('Набор данных', max_length=50, primary_key=True)
+    value = models.PositiveIntegerField('Номер', default=0)
+    changed = models.DateTimeField('Изменён', null=True)
+
+    class Meta:
+        verbose_name = 'Ревизия'
+        verbose_name_plural = 'Ревизии'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
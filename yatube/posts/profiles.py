@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from core.metrics import record_cache
+from core.routers import cache_timeout
+
+from .cache import bump_version, get_version
+from .models import User, UserStats
+
+HEADER_KEY = 'posts:profile:{}:{}'
+HEADER_VERSION = 'profile:{}'
+
+HEADER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+def load_header(username):
+    """Автор и его счётчики одним запросом."""
+    return User.objects.filter(username=username).annotate(
+        posts_count=Coalesce(F('stats__posts_count'), 0),
+        followers_count=Coalesce(F('stats__followers_count'), 0),
+        following_count=Coalesce(F('stats__following_count'), 0),
+    ).values(
+        *HEADER_FIELDS, 'posts_count', 'followers_count', 'following_count'
+    ).first()
+
+
+def profile_header(username):
+    """Шапка профиля из кэша или load_header; None, если автора нет.
+
+    Значение одно на всех зрителей (подписку проверяет is_following)
+    и помнит версию 'profile:<id автора>', которую сигналы сдвигают
+    при изменении постов, подписок и самого пользователя. Массовый
+    пересчёт счётчиков сдвигает общую версию 'profiles'.
+    """
+    key = HEADER_KEY.format(get_version('profiles'), username)
+    cached = cache.get(key)
+    if cached is not None:
+        version, header = cached
+        if version == get_version(HEADER_VERSION.format(header['id'])):
+            record_cache('profile', True)
+            return header
+    record_cache('profile', False)
+    header = load_header(username)
+    if header is None:
+        return None
+    version = get_version(HEADER_VERSION.format(header['id']))
+    cache.set(key, (version, header), cache_timeout(
+        settings.PROFILE_CACHE_TIMEOUT, User.objects.db))
+    return header
+
+
+def header_author(header):
+    """Несохраняемый User со stats из шапки — для шаблонов."""
+    author = User(**{field: header[field] for field in HEADER_FIELDS})
+    author.stats = UserStats(
+        user=author,
+        posts_count=header['posts_count'],
+        followers_count=header['followers_count'],
+        following_count=header['following_count'],
+    )
+    return author
+
+
+def invalidate(*user_ids):
+    for user_id in user_ids:
+        bump_version(HEADER_VERSION.format(user_id))
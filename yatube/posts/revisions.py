@@ -0,0 +1,37 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Revision
+
+
+def bump_revision(name):
+    """Отмечает изменение набора данных name в текущей транзакции."""
+    now = timezone.now()
+    updated = Revision.objects.filter(name=name).update(
+        value=F('value') + 1, changed=now)
+    if not updated:
+        try:
+            with transaction.atomic():
+                Revision.objects.create(name=name, value=1, changed=now)
+        except IntegrityError:
+            bump_revision(name)
+
+
+def get_revisions(request, *names):
+    """Ревизии names одним запросом, запомненные на время запроса.
+
+    Возвращает {name: (номер, время изменения)}; для набора, который
+    ещё не менялся, — (0, None). Читаются из той же базы, что и
+    данные страницы, поэтому валидаторы совпадают с её содержимым.
+    """
+    known = request.__dict__.setdefault('_revisions', {})
+    missing = [name for name in names if name not in known]
+    if missing:
+        known.update({name: (0, None) for name in missing})
+        known.update(
+            (name, (value, changed))
+            for name, value, changed in Revision.objects.filter(
+                name__in=missing).values_list('name', 'value', 'changed')
+        )
+    return {name: known[name] for name in names}
@@ -0,0 +1,162 @@
+import re
+
+from django.db import connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import CursorPage, CursorPaginator, decode_cursor, encode_cursor
+
+FTS_TABLE = 'posts_post_fts'
+TERM_RE = re.compile(r'\w+')
+MAX_TERMS = 10
+SNIPPET_TOKENS = 24
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SEARCH_SQL = f"""
+    SELECT post.id,
+           bm25({FTS_TABLE}) AS score,
+           snippet({FTS_TABLE}, 0, %s, %s, '…', %s)
+    FROM {FTS_TABLE}
+    JOIN posts_post AS post ON post.id = {FTS_TABLE}.rowid
+    WHERE {{where}}
+    ORDER BY score {{direction}}, post.id {{direction}}
+    LIMIT %s
+"""
+
+_fts_enabled = {}
+
+
+def fts_enabled(using='default'):
+    """Есть ли в базе индекс FTS5 (создаётся миграцией только в SQLite)."""
+    if using not in _fts_enabled:
+        connection = connections[using]
+        enabled = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                enabled = FTS_TABLE in (
+                    connection.introspection.table_names(cursor))
+        _fts_enabled[using] = enabled
+    return _fts_enabled[using]
+
+
+def terms(query):
+    return TERM_RE.findall(query)[:MAX_TERMS]
+
+
+def match_expression(query):
+    """Запрос FTS5 из пользовательского ввода: все слова, по префиксу.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 во вводе
+    не интерпретируются.
+    """
+    return ' '.join(f'"{term}"*' for term in terms(query))
+
+
+def filter_matching(queryset, query):
+    """Оставляет в queryset постов только совпавшие с запросом."""
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        where=[
+            f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[match_expression(query)]
+    )
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и превращает маркеры совпадений в <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def _parse_cursor(token):
+    values = decode_cursor(token)
+    if values is None or len(values) != 2:
+        return None
+    rank, pk = values
+    if not isinstance(rank, (int, float)) or not isinstance(pk, int):
+        return None
+    return rank, pk
+
+
+def _fts_page(query, per_page, after, before, group, author):
+    where = [f'{FTS_TABLE} MATCH %s']
+    params = [match_expression(query)]
+    if group is not None:
+        where.append('post.group_id = %s')
+        params.append(group.pk)
+    if author is not None:
+        where.append('post.author_id = %s')
+        params.append(author.pk)
+    after_values = _parse_cursor(after)
+    before_values = None if after_values else _parse_cursor(before)
+    forward = before_values is None
+    seek = after_values or before_values
+    if seek is not None:
+        rank, pk = seek
+        sign = '>' if forward else '<'
+        where.append(
+            f'(bm25({FTS_TABLE}) {sign} %s '
+            f'OR (bm25({FTS_TABLE}) = %s AND post.id {sign} %s))'
+        )
+        params.extend((rank, rank, pk))
+    sql = SEARCH_SQL.format(
+        where=' AND '.join(where),
+        direction='ASC' if forward else 'DESC'
+    )
+    params = [MARK_START, MARK_END, SNIPPET_TOKENS, *params, per_page + 1]
+    with connections[Post.objects.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if forward:
+        has_next, has_previous = has_more, after_values is not None
+    else:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    posts = Post.objects.for_feed().in_bulk([row[0] for row in rows])
+    results = []
+    for pk, rank, snippet in rows:
+        post = posts.get(pk)
+        if post is None:
+            continue
+        post.rank = rank
+        post.snippet = highlight(snippet)
+        results.append(post)
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor([rows[-1][1], rows[-1][0]])
+    if rows and has_previous:
+        previous_cursor = encode_cursor([rows[0][1], rows[0][0]])
+    return CursorPage(results, next_cursor, previous_cursor)
+
+
+def search_posts(query, per_page, after=None, before=None,
+                 group=None, author=None):
+    """Страница результатов поиска по тексту постов.
+
+    В SQLite посты ранжируются bm25 по индексу FTS5, у каждого есть
+    snippet с подсвеченными совпадениями; листание — keyset по
+    (rank, id). В других СУБД — фильтр icontains по всем словам
+    и обычный keyset по дате.
+    """
+    if not terms(query):
+        return CursorPage([])
+    if fts_enabled(Post.objects.db):
+        return _fts_page(query, per_page, after, before, group, author)
+    queryset = Post.objects.for_feed()
+    for term in terms(query):
+        queryset = queryset.filter(text__icontains=term)
+    if group is not None:
+        queryset = queryset.filter(group=group)
+    if author is not None:
+        queryset = queryset.filter(author=author)
+    return CursorPaginator(queryset, per_page).page(
+        after=after, before=before)
@@ -0,0 +1,211 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from PIL import Image
+
+from . import counters, feed, following, images, media, profiles, thumbnails
+from .cache import bump_version
+from .revisions import bump_revision
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_post_counts(sender, **kwargs):
+    """Сбрасывает закэшированные количества записей в лентах."""
+    bump_version('posts')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_counts(sender, **kwargs):
+    """Сбрасывает ETag списков API, где отдаётся comments_count."""
+    bump_version('comments')
+    bump_revision('comments')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def invalidate_listings(sender, **kwargs):
+    """Сбрасывает фрагменты лент (тег listing_cache) и их ETag."""
+    bump_version('listing')
+    bump_revision('listing')
+
+
+@receiver(post_save, sender=User)
+def invalidate_listings_on_user_change(sender, created, update_fields,
+                                       **kwargs):
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    bump_version('listing')
+    bump_revision('listing')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_author_profile(sender, instance, **kwargs):
+    profiles.invalidate(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    """Счётчики обоих пользователей и флаг подписки в шапке автора."""
+    profiles.invalidate(instance.author_id, instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_profile(sender, instance, **kwargs):
+    profiles.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, followers_count=1)
+        counters.change_user_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+    counters.change_user_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def cache_new_follow(sender, instance, created, **kwargs):
+    if created:
+        following.follow_changed(instance.user_id, instance.author_id, True)
+
+
+@receiver(post_delete, sender=Follow)
+def cache_deleted_follow(sender, instance, **kwargs):
+    following.follow_changed(instance.user_id, instance.author_id, False)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_inbox(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill_inbox(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_inbox(sender, instance, **kwargs):
+    feed.trim_inbox(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def fan_out_returning_author(sender, instance, **kwargs):
+    feed.author_unfollowed(instance.author_id)
+
+
+def _image_name(value):
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    """Запоминает картинку, чтобы при сохранении увидеть её замену.
+
+    Отложенное поле (.only() без image) не читается: None значит
+    «неизвестно», и такой экземпляр ссылки не меняет.
+    """
+    instance._stored_image = (
+        _image_name(instance.__dict__['image'])
+        if 'image' in instance.__dict__ else None
+    )
+
+
+@receiver(pre_save, sender=Post)
+def describe_image(sender, instance, raw=False, **kwargs):
+    """Размеры и заглушка считаются один раз — при смене картинки.
+
+    Варианты для srcset заново запишет thumbnails.generate.
+    """
+    if raw or 'image' not in instance.__dict__:
+        return
+    name = _image_name(instance.image)
+    previous = '' if instance._state.adding else instance._stored_image
+    if previous is None or name == previous:
+        return
+    instance.image_width = instance.image_height = None
+    instance.image_placeholder = instance.image_variants = ''
+    if not name:
+        return
+    try:
+        dimensions, placeholder = images.describe_image(instance.image)
+    except (OSError, ValueError, SuspiciousFileOperation,
+            Image.DecompressionBombError):
+        return
+    finally:
+        if instance.image._committed:
+            instance.image.close()
+    instance.image_width, instance.image_height = dimensions
+    instance.image_placeholder = placeholder
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, created, raw=False,
+                           **kwargs):
+    if raw or 'image' not in instance.__dict__:
+        return
+    name = _image_name(instance.image)
+    previous = '' if created else instance._stored_image
+    if previous is None or name == previous:
+        return
+    media.acquire(name)
+    media.release(previous)
+    instance._stored_image = name
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    media.release(instance._stored_image)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    thumbnails.enqueue(instance.image)
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются SHA-256 содержимого и лежат в подкаталогах.
+
+    posts/picture.gif сохраняется как posts/ab/cd/abcd…ef.gif, поэтому
+    одинаковая картинка хранится (и нарезается в миниатюры) один раз,
+    а ни один каталог не разрастается. Повторная загрузка ничего не
+    пишет и возвращает имя уже сохранённого файла.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest[2:4],
+            f'{digest}{extension}'
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # _save зовёт его, если файл успели создать параллельно:
+        # содержимое то же самое, перезаписывать нечего
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        try:
+            return self._save(name, content)
+        except FileExistsError:
+            return name
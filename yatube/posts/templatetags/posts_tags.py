@@ -0,0 +1,140 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from core.metrics import record_cache
+from core.routers import cache_timeout
+
+from .. import following, thumbnails
+from ..cache import get_version
+from ..models import Post
+from ..utils import cursor_after, elided_page_range
+
+register = template.Library()
+
+PAGINATION_PARAMS = ('page', 'after', 'before')
+
+
+@register.inclusion_tag('posts/includes/paginator.html', takes_context=True)
+def paginator(context, page_obj):
+    """Навигация по страницам: окно номеров вокруг текущей страницы."""
+    query = context['request'].GET.copy()
+    for param in PAGINATION_PARAMS:
+        query.pop(param, None)
+    base_query = query.urlencode()
+    if base_query:
+        base_query += '&'
+    navigation = {
+        'page_obj': page_obj,
+        'base_query': base_query,
+    }
+    if not getattr(page_obj, 'is_cursor', False):
+        navigation['pages'] = elided_page_range(page_obj)
+        navigation['next_cursor'] = cursor_after(page_obj)
+    return navigation
+
+
+@register.inclusion_tag('posts/includes/responsive_image.html')
+def responsive_image(post):
+    """<picture> с вариантами картинки поста для srcset.
+
+    Готовые варианты (см. thumbnails.variants) берутся из
+    post.image_variants, без запросов к kvstore, и только не шире самой
+    картинки. Под картинкой лежит размытая заглушка из
+    post.image_placeholder; пока нет базового JPEG, выводится только
+    она, а генерация ставится в очередь.
+    """
+    image = post.image
+    width, height = settings.POST_CARD_IMAGE_SIZE
+    context = {
+        'image': image,
+        'width': width,
+        'height': height,
+        'placeholder': post.image_placeholder,
+    }
+    if not image:
+        return context
+    found = thumbnails.stored_variants(post)
+    fallback = dict(found.pop('JPEG', ()))
+    if width not in fallback:
+        thumbnails.enqueue(image)
+        return context
+    limit = max(post.image_width or 0, width)
+    context.update(
+        src=fallback[width],
+        srcset=_srcset(fallback.items(), limit),
+        sizes=settings.POST_CARD_IMAGE_SIZES,
+        sources=[
+            {'type': thumbnails.mime_type(image_format),
+             'srcset': _srcset(variants, limit)}
+            for image_format, variants in found.items()
+        ],
+    )
+    if len(found) + 1 < len(thumbnails.image_formats()):
+        thumbnails.enqueue(image)
+    return context
+
+
+def _srcset(variants, limit):
+    """Варианты (ширина, url) не шире limit: увеличенная копия не
+    чётче исходника."""
+    return ', '.join(
+        f'{url} {variant_width}w'
+        for variant_width, url in variants if variant_width <= limit
+    )
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author):
+    """Подписан ли текущий пользователь на автора (объект или id).
+
+    Проверка по закэшированному массиву подписок, без запросов к БД:
+    {% is_following post.author_id as followed %}.
+    """
+    return following.is_following(context['request'].user, author)
+
+
+class ListingCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [
+            get_version('listing'),
+            context['request'].get_full_path(),
+        ]
+        vary_on.extend(var.resolve(context) for var in self.vary_on)
+        key = make_template_fragment_key(
+            f'listing:{self.fragment_name}', vary_on)
+        value = cache.get(key)
+        record_cache('listing', value is not None)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, cache_timeout(
+                settings.LISTING_CACHE_TIMEOUT, Post.objects.db))
+        return value
+
+
+@register.tag
+def listing_cache(parser, token):
+    """Кэширует фрагмент ленты до изменения данных.
+
+    Ключ зависит от имени фрагмента, пути с параметрами запроса
+    (страница, курсор, группа, автор), дополнительных аргументов
+    и версии 'listing', которую сдвигают сигналы Post, Group, User
+    и Follow. Пример: {% listing_cache 'follow_index' user.pk %}.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least 1 argument.")
+    nodelist = parser.parse(('endlisting_cache',))
+    parser.delete_first_token()
+    return ListingCacheNode(
+        nodelist,
+        bits[1].strip('\'"'),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
@@ -0,0 +1,120 @@
+from xml.dom import minidom
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='Writer', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Классика',
+            slug='classic',
+            description='Описание'
+        )
+        for number in range(5):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Пост <{number}> & текст',
+                group=cls.group if number % 2 else None
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def read(self, response):
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.content
+
+    def entries(self, url, tag):
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        document = minidom.parseString(self.read(response))
+        return document.getElementsByTagName(tag)
+
+    @override_settings(SYNDICATION_CHUNK_SIZE=2)
+    def test_feeds_content(self):
+        """ Ленты RSS и Atom: все посты, группа и автор по отдельности. """
+        cases = (
+            (reverse('posts:rss'), 'item', 5),
+            (reverse('posts:atom'), 'entry', 5),
+            (reverse('posts:group_rss', args=['classic']), 'item', 2),
+            (reverse('posts:group_atom', args=['classic']), 'entry', 2),
+            (reverse('posts:profile_rss', args=['Writer']), 'item', 5),
+            (reverse('posts:profile_atom', args=['Writer']), 'entry', 5),
+        )
+        for url, tag, count in cases:
+            with self.subTest(url=url):
+                entries = self.entries(url, tag)
+                self.assertEqual(len(entries), count)
+        titles = self.entries(reverse('posts:rss'), 'title')
+        self.assertEqual(titles[1].firstChild.data, 'Пост <4> & текст')
+
+    @override_settings(SYNDICATION_ITEMS=3)
+    def test_feed_limit(self):
+        """ В ленте не больше SYNDICATION_ITEMS записей. """
+        self.assertEqual(len(self.entries(reverse('posts:rss'), 'item')), 3)
+
+    def test_feed_streamed_then_cached(self):
+        """ Первый ответ потоковый, повторный — из кэша до нового поста. """
+        url = reverse('posts:atom')
+        first = self.guest_client.get(url)
+        self.assertIsInstance(first, StreamingHttpResponse)
+        content = self.read(first)
+        cached = self.guest_client.get(url)
+        self.assertFalse(cached.streaming)
+        self.assertEqual(cached.content, content)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        fresh = self.guest_client.get(url)
+        self.assertTrue(fresh.streaming)
+        self.assertIn('Свежий пост', self.read(fresh).decode())
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'mirror.example'])
+    def test_feed_cached_per_host(self):
+        """ Закэшированная лента не отдаёт ссылки на чужой хост. """
+        url = reverse('posts:atom')
+        self.read(self.guest_client.get(url))
+        response = self.guest_client.get(
+            url, HTTP_HOST='mirror.example', secure=True)
+        self.assertTrue(response.streaming)
+        content = self.read(response).decode()
+        self.assertIn('https://mirror.example/', content)
+        self.assertNotIn('http://testserver/', content)
+
+    def test_feed_conditional_get(self):
+        """ Повторный запрос с ETag — 304, после нового поста — 200. """
+        url = reverse('posts:rss')
+        response = self.guest_client.get(url)
+        self.read(response)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        not_modified = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        other = self.guest_client.get(
+            reverse('posts:atom'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+        Post.objects.create(author=self.user, text='Ещё пост')
+        changed = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+
+    def test_feed_not_found(self):
+        """ Лента несуществующей группы или автора — 404. """
+        for url in (
+            reverse('posts:group_rss', args=['missing']),
+            reverse('posts:profile_atom', args=['missing']),
+        ):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 404)
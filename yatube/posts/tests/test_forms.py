@@ -1,13 +1,22 @@
+import hashlib
+import os
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
 
-from ..models import Comment, Group, Post
+from .. import media, thumbnails
+from ..forms import PostForm
+from ..models import Comment, Group, Post, StoredFile
 
 User = get_user_model()
 
@@ -32,6 +41,7 @@ class FormTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -177,7 +187,9 @@ class FormTests(TestCase):
         self.assertEqual(Comment.objects.count(), comments_count)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+# Миниатюры создаются в том же потоке: фоновые потоки могли бы писать
+# во временный MEDIA_ROOT уже после его удаления
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class ImagionFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -208,6 +220,7 @@ class ImagionFormTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -239,7 +252,11 @@ class ImagionFormTests(TestCase):
             'username': self.user.username}))
         self.assertEqual(Post.objects.count(), posts_count + 1)
         first_post = Post.objects.first()
-        self.assertEqual(first_post.image, 'posts/picture.gif')
+        self.assertRegex(
+            first_post.image.name, r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.gif$')
+        with first_post.image.open('rb') as stored:
+            digest = hashlib.sha256(stored.read()).hexdigest()
+        self.assertEqual(first_post.image.name[12:-4], digest)
         self.assertEqual(first_post.author, self.post.author)
         self.assertEqual(first_post.group, self.post.group)
 
@@ -282,3 +299,181 @@ class ImagionFormTests(TestCase):
         self.assertEqual(test_posts.image, self.post.image)
         test_object = response.context['posts']
         self.check_post(test_object)
+
+    def test_thumbnails_pregenerated_outside_request(self):
+        """ Страница не создаёт миниатюру сама: до фоновой генерации
+        выводится заглушка, после — готовая картинка. """
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=self.picture,
+            content_type='image/gif')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой', 'image': uploaded})
+        post = Post.objects.first()
+        options = {'crop': 'center', 'upscale': True}
+        self.assertIsNone(get_thumbnail(post.image, '960x339', **options))
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        thumbnails.generate(post.image)
+        thumbnail = get_thumbnail(post.image, '960x339', **options)
+        self.assertIsNotNone(thumbnail)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    def upload(self, name, size, image_format, **save_options):
+        output = BytesIO()
+        Image.new('RGB', size, (200, 50, 50)).save(
+            output, image_format, **save_options)
+        return SimpleUploadedFile(name, output.getvalue())
+
+    @override_settings(POST_IMAGE_MAX_SIZE=64)
+    def test_image_downsampled_and_stripped(self):
+        """ Большая картинка уменьшается, поворачивается по EXIF
+        и сохраняется без метаданных. """
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        uploaded = self.upload(
+            'photo.jpeg', (400, 200), 'JPEG', exif=exif.tobytes())
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': uploaded})
+        post = Post.objects.first()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (32, 64))
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(len(stored.getexif()), 0)
+
+    @override_settings(POST_IMAGE_MAX_SIZE=64)
+    def test_image_keeps_transparency_and_profile(self):
+        """ При пересохранении остаются прозрачность и цветовой
+        профиль. """
+        # Содержимое профиля Pillow не разбирает, хватит любых байтов
+        profile = b'icc profile stand-in'
+        image = Image.new('P', (200, 100))
+        image.putpalette([255, 255, 255, 200, 50, 50] + [0] * 762)
+        image.paste(1, (100, 0, 200, 100))
+        output = BytesIO()
+        image.save(output, 'PNG', transparency=0, icc_profile=profile)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Логотип', 'image': SimpleUploadedFile(
+                'logo.png', output.getvalue())})
+        post = Post.objects.first()
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (64, 32))
+            self.assertEqual(stored.info.get('icc_profile'), profile)
+            self.assertEqual(
+                stored.convert('RGBA').getpixel((0, 0))[3], 0)
+            self.assertEqual(
+                stored.convert('RGBA').getpixel((63, 0))[3], 255)
+
+    @override_settings(POST_IMAGE_MAX_SIZE=64)
+    def test_jpeg_keeps_profile(self):
+        """ Цветовой профиль JPEG тоже сохраняется. """
+        profile = b'icc profile stand-in'
+        uploaded = self.upload(
+            'photo.jpeg', (100, 100), 'JPEG', icc_profile=profile)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': uploaded})
+        with Image.open(Post.objects.first().image.path) as stored:
+            self.assertEqual(stored.info.get('icc_profile'), profile)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_image_rejected_by_header(self):
+        """ Слишком большие и неподдерживаемые картинки не принимаются. """
+        uploads = (
+            ('image_size', self.upload('big.png', (20, 20), 'PNG')),
+            ('image_format', self.upload('small.bmp', (5, 5), 'BMP')),
+        )
+        for code, uploaded in uploads:
+            with self.subTest(code=code):
+                form = PostForm(
+                    data={'text': 'Текст'}, files={'image': uploaded})
+                self.assertFalse(form.is_valid())
+                self.assertEqual(form.errors.as_data()['image'][0].code, code)
+
+    def test_duplicate_upload_stored_once(self):
+        """ Одинаковые картинки хранятся одним файлом со счётчиком ссылок,
+        файл удаляется вместе с последним постом. """
+        for number in range(2):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': f'Мем {number}',
+                    'image': SimpleUploadedFile(
+                        f'meme{number}.gif', self.picture, 'image/gif'),
+                })
+        first, second = Post.objects.filter(text__startswith='Мем')
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 2)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(first.image.path))), 1)
+        path = first.image.path
+        first.delete()
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 1)
+        second.image = ''
+        second.save()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertTrue(os.path.exists(path))
+        media.delete_unused(name)
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(
+        POST_CARD_IMAGE_WIDTHS=(320, 960), POST_CARD_IMAGE_FORMATS=(
+            'PNG', 'JPEG'))
+    def test_responsive_image_variants(self):
+        """ Карточка выводит srcset всех ширин, дополнительный формат
+        отдельным <source> и размеры для ленивой загрузки; варианты
+        берутся из поста, без kvstore. """
+        uploaded = SimpleUploadedFile('variants.gif', self.picture)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Варианты', 'image': uploaded})
+        post = Post.objects.first()
+        thumbnails.generate(post.image)
+        lookup = mock.patch.object(
+            thumbnails.PregeneratedThumbnailBackend, 'get_cached_thumbnail')
+        with lookup as get_cached_thumbnail:
+            response = self.guest_client.get(reverse('posts:index'))
+        get_cached_thumbnail.assert_not_called()
+        options = {'crop': 'center', 'upscale': True}
+        jpeg = [
+            get_thumbnail(post.image, geometry, **options)
+            for geometry in ('320x113', '960x339')
+        ]
+        png = get_thumbnail(post.image, '320x113', format='PNG', **options)
+        self.assertContains(
+            response,
+            f'srcset="{jpeg[0].url} 320w, {jpeg[1].url} 960w"')
+        self.assertContains(response, f'src="{jpeg[1].url}"')
+        self.assertContains(response, '<source type="image/png"')
+        self.assertContains(response, f'{png.url} 320w')
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_image_placeholder_saved(self):
+        """ Размеры и заглушка считаются при сохранении картинки
+        и выводятся в карточке до появления вариантов. """
+        uploaded = self.upload('wide.png', (300, 100), 'PNG')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Заглушка', 'image': uploaded})
+        post = Post.objects.first()
+        self.assertEqual((post.image_width, post.image_height), (300, 100))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(post.image_placeholder), 1000)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, post.image_placeholder)
+        post.text = 'Новый текст'
+        post.save()
+        post.image = ''
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_placeholder, '')
+        self.assertIsNone(post.image_width)
@@ -1,7 +1,12 @@
+import os
+from datetime import datetime, timezone
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, FeedItem, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -33,3 +38,139 @@ class PostModelTest(TestCase):
         for expected_object_name, model in models.items():
             with self.subTest(expected_object_name=expected_object_name):
                 self.assertEqual(expected_object_name, model)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_recount_command(self):
+        """Команда recount_counters исправляет рассинхронизацию."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        UserStats.objects.update(posts_count=100)
+        Post.objects.update(comments_count=100)
+        call_command('recount_counters', stdout=open(os.devnull, 'w'))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+
+class SeedCommandTest(TestCase):
+    def seed(self, **options):
+        call_command(
+            'seed', users=30, groups=3, posts=200, comments=300,
+            follows=100, stdout=open(os.devnull, 'w'), **options)
+
+    def test_seed_creates_consistent_data(self):
+        """Команда seed создаёт данные с верными счётчиками и лентами."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)),
+            200
+        )
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 300)
+        expected_items = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.values_list(
+                'author_id', flat=True)
+        )
+        self.assertEqual(FeedItem.objects.count(), expected_items)
+        self.assertLess(
+            Post.objects.order_by('pub_date').first().pub_date,
+            Post.objects.order_by('-pub_date').first().pub_date
+        )
+
+    def test_seed_is_deterministic(self):
+        """Одинаковый --seed даёт одинаковые посты и даты."""
+        self.seed(prefix='first')
+        self.seed(prefix='second')
+        first, second = (
+            sorted(
+                Post.objects.filter(author__username__startswith=prefix)
+                .values_list('text', 'pub_date')
+            )
+            for prefix in ('first_', 'second_')
+        )
+        self.assertEqual(first, second)
+
+    def test_seed_dates_are_anchored(self):
+        """Даты отсчитываются от --now, а не от текущего момента."""
+        self.seed(
+            now=datetime(2020, 6, 1, 12, tzinfo=timezone.utc), days=10)
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertLessEqual(
+            max(dates), datetime(2020, 6, 1, 12, tzinfo=timezone.utc))
+        self.assertGreaterEqual(
+            min(dates), datetime(2020, 5, 22, 12, tzinfo=timezone.utc))
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Planner')
+        cls.group = Group.objects.create(
+            title='Группа', slug='plan', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост')
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_hot_queries_use_indexes(self):
+        """Основные запросы страниц идут по индексам, без сортировки."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN есть только в SQLite')
+        queries = {
+            'index': Post.objects.for_feed()[:10],
+            'group_posts': self.group.posts.for_feed()[:10],
+            'profile': self.user.posts.for_feed()[:10],
+            'follow_index': FeedItem.objects.filter(user=self.user)[:10],
+            'post_detail': Comment.objects.filter(
+                post=self.post).order_by('created', 'id')[:10],
+            'following': Follow.objects.filter(
+                user=self.user, author=self.user),
+        }
+        for view, queryset in queries.items():
+            with self.subTest(view=view):
+                plan = self.query_plan(queryset)
+                for step in plan:
+                    self.assertNotIn('TEMP B-TREE', step)
+                    if step.startswith('SCAN'):
+                        self.assertIn('USING', step)
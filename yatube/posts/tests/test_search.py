@@ -0,0 +1,110 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..admin import PostAdmin
+from ..models import Group, Post
+from ..search import fts_enabled
+
+User = get_user_model()
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Finder')
+        cls.other = User.objects.create_user(username='Other')
+        cls.group = Group.objects.create(
+            title='Ежи',
+            slug='hedgehogs',
+            description='Описание'
+        )
+        cls.best = Post.objects.create(
+            author=cls.user,
+            text='Туман, туман и снова <b>туман</b>',
+            group=cls.group
+        )
+        for number in range(4):
+            Post.objects.create(
+                author=cls.other,
+                text=f'Утро {number}: над рекой стоял туман, а потом рассеялся'
+            )
+        Post.objects.create(author=cls.user, text='Про солнце')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def search(self, **params):
+        return self.guest_client.get(reverse('posts:search'), params)
+
+    def test_results_ranked_and_highlighted(self):
+        """ Лучшее совпадение первым, совпадения подсвечены и экранированы. """
+        response = self.search(q='туман')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 5)
+        if not fts_enabled():
+            self.skipTest('СУБД без FTS5')
+        self.assertEqual(page_obj[0], self.best)
+        self.assertContains(response, '<mark>туман</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+        self.assertNotContains(response, '<b>')
+
+    def test_keyset_pagination(self):
+        """ Результаты листаются курсором без повторов. """
+        first = self.search(q='туман', size=3).context['page_obj']
+        second = self.search(
+            q='туман', size=3, after=first.next_cursor).context['page_obj']
+        self.assertFalse(second.has_next())
+        self.assertEqual(
+            {post.pk for post in first} | {post.pk for post in second},
+            set(Post.objects.filter(text__icontains='туман').values_list(
+                'pk', flat=True))
+        )
+        self.assertEqual(len(second), 2)
+
+    def test_filters(self):
+        """ Поиск сужается группой и автором. """
+        cases = {
+            'group': {'group': self.group.slug},
+            'author': {'author': self.user.username},
+        }
+        for name, params in cases.items():
+            with self.subTest(filter=name):
+                page_obj = self.search(q='туман', **params).context[
+                    'page_obj']
+                self.assertEqual(list(page_obj), [self.best])
+
+    def test_unknown_filter_finds_nothing(self):
+        """ Неизвестные группа или автор не снимают фильтр. """
+        for params in ({'group': 'nobody'}, {'author': 'nobody'}):
+            with self.subTest(**params):
+                page_obj = self.search(q='туман', **params).context[
+                    'page_obj']
+                self.assertEqual(list(page_obj), [])
+
+    def test_index_follows_edit_and_delete(self):
+        """ Индекс обновляется при изменении и удалении поста. """
+        post = Post.objects.create(author=self.user, text='Радуга')
+        Post.objects.filter(pk=post.pk).update(text='Гроза')
+        self.assertEqual(len(self.search(q='радуга').context['page_obj']), 0)
+        self.assertEqual(len(self.search(q='гроза').context['page_obj']), 1)
+        post.delete()
+        self.assertEqual(len(self.search(q='гроза').context['page_obj']), 0)
+
+    def test_query_syntax_is_not_interpreted(self):
+        """ Операторы FTS5 во вводе не ломают поиск. """
+        response = self.search(q='"туман*) ^(')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_admin_search(self):
+        """ Поиск в админке находит посты по словам текста. """
+        post_admin = PostAdmin(Post, admin.site)
+        queryset, use_distinct = post_admin.get_search_results(
+            None, Post.objects.all(), 'солнце')
+        self.assertFalse(use_distinct)
+        self.assertEqual(queryset.count(), 1)
@@ -0,0 +1,124 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from ..cache import get_version
+from ..models import Post
+from ..utils import (CachedCountPaginator, CappedPaginator,
+                     elided_page_range, estimate_count)
+
+User = get_user_model()
+
+
+class PaginationUtilsTests(TestCase):
+    def test_elided_page_range_is_windowed(self):
+        """ Окно номеров не зависит от общего числа страниц. """
+        paginator = Paginator(range(20000), 10)
+        cases = {
+            1: [1, 2, 3, None, 2000],
+            5: [1, None, 3, 4, 5, 6, 7, None, 2000],
+            2000: [1, None, 1998, 1999, 2000],
+        }
+        for number, expected in cases.items():
+            with self.subTest(number=number):
+                page_obj = paginator.page(number)
+                self.assertEqual(elided_page_range(page_obj), expected)
+
+    def test_elided_page_range_short(self):
+        """ Короткий список страниц выводится целиком. """
+        page_obj = Paginator(range(30), 10).page(2)
+        self.assertEqual(elided_page_range(page_obj), [1, 2, 3])
+
+    def test_capped_paginator(self):
+        """ Страницы дальше max_pages недоступны. """
+        paginator = CappedPaginator(range(1000), 10, max_pages=5)
+        self.assertEqual(paginator.num_pages, 5)
+        self.assertTrue(paginator.truncated)
+        self.assertEqual(paginator.get_page(5000).number, 5)
+
+
+@override_settings(POSTS_PER_PAGE_MAX=3, POSTS_MAX_PAGE=2)
+class PaginationViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Pages')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {number}')
+            for number in range(10)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_page_size_is_capped(self):
+        """ ?size= ограничен сверху настройкой POSTS_PER_PAGE_MAX. """
+        response = self.guest_client.get(reverse('posts:index'), {
+            'size': 100})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_last_page_continues_with_cursor(self):
+        """ Последняя доступная страница ведёт дальше курсором. """
+        response = self.guest_client.get(reverse('posts:index'), {
+            'size': 2, 'page': 5000})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertContains(response, '?size=2&amp;after=')
+
+
+class CachedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Counter')
+        for number in range(3):
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached(self):
+        """ Повторный подсчёт записей не обращается к базе. """
+        self.assertEqual(
+            CachedCountPaginator(Post.objects.all(), 10).count, 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                CachedCountPaginator(Post.objects.all(), 10).count, 3)
+
+    def test_count_invalidated_on_save_and_delete(self):
+        """ Создание и удаление поста сбрасывает кэш количества. """
+        queryset = Post.objects.filter(author=self.user)
+        self.assertEqual(CachedCountPaginator(queryset, 10).count, 3)
+        post = Post.objects.create(author=self.user, text='Ещё пост')
+        self.assertEqual(CachedCountPaginator(queryset, 10).count, 4)
+        post.delete()
+        self.assertEqual(CachedCountPaginator(queryset, 10).count, 3)
+
+    def test_estimate_only_for_whole_table(self):
+        """ Оценка доступна лишь для нефильтрованной выборки. """
+        self.assertIsNone(estimate_count(Post.objects.filter(text='x')))
+
+    @override_settings(POSTS_COUNT_ESTIMATE_THRESHOLD=1)
+    def test_estimate_used_above_threshold(self):
+        """ Для больших таблиц вместо COUNT(*) берётся статистика. """
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        estimate = estimate_count(Post.objects.all())
+        if estimate is None:
+            self.skipTest('СУБД не предоставляет статистику')
+        paginator = CachedCountPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, estimate)
+
+
+class VersionBumpTests(TransactionTestCase):
+    def test_version_bumped_again_after_commit(self):
+        """ Кэш, заполненный до коммита записи, после коммита устаревает. """
+        user = User.objects.create_user(username='writer')
+        with transaction.atomic():
+            Post.objects.create(author=user, text='Пост')
+            before_commit = get_version('listing')
+        self.assertGreater(get_version('listing'), before_commit)
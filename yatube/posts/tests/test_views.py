@@ -1,12 +1,17 @@
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from ..following import following_ids, is_following
 from ..forms import PostForm
-from ..models import Comment, Follow, Group, Post
+from ..models import Comment, FeedItem, Follow, Group, Post
 
 User = get_user_model()
 
@@ -44,6 +49,7 @@ class PostViewsTests(TestCase):
         }
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -214,7 +220,7 @@ class PostViewsTests(TestCase):
         """ Корректность раболты cache на главной странице. """
         primary_response = self.guest_client.get(
             reverse('posts:index')).content
-        Post.objects.filter(text=self.post.text).delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Обход сигналов')
         response_action = self.guest_client.get(reverse('posts:index')).content
         self.assertEqual(primary_response, response_action)
         cache.clear()
@@ -222,6 +228,23 @@ class PostViewsTests(TestCase):
             reverse('posts:index')).content
         self.assertNotEqual(response_clear_action, primary_response)
 
+    def test_cache_invalidated_on_post_delete(self):
+        """ Удаление поста сразу сбрасывает кэш лент. """
+        primary_response = self.guest_client.get(
+            reverse('posts:index')).content
+        Post.objects.filter(text=self.post.text).delete()
+        response_action = self.guest_client.get(reverse('posts:index')).content
+        self.assertNotEqual(primary_response, response_action)
+
+    def test_cache_varies_by_page(self):
+        """ Закэшированная первая страница не подменяет вторую. """
+        for number in range(settings.POSTS_PER_PAGE):
+            Post.objects.create(text=f'Пост {number}', author=self.user)
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(reverse('posts:index'), {'page': 2})
+        self.assertContains(second, self.post.text)
+        self.assertNotContains(first, self.post.text)
+
 
 class PiginatorViewsTest(TestCase):
     @classmethod
@@ -242,6 +265,7 @@ class PiginatorViewsTest(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -309,6 +333,234 @@ class PiginatorViewsTest(TestCase):
                 ), SECOND_PAGE_PAGINATOR_POSTS)
 
 
+@override_settings(POSTS_PAGINATION='cursor')
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Cursor')
+        cls.group = Group.objects.create(
+            title='Группа курсоров',
+            slug='cursor_slug',
+            description='Описание'
+        )
+        for post_text in range(SUM_OF_PAGINATOR_POSTS):
+            Post.objects.create(
+                author=cls.user,
+                group=cls.group,
+                text=f'{post_text} Тестовый текст'
+            )
+        cls.pages = [
+            reverse('posts:index'),
+            reverse('posts:group_lists', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """ Переход по ?after= и обратно по ?before=
+        возвращает те же записи без пропусков. """
+        for page in self.pages:
+            with self.subTest(page=page):
+                first = self.authorized_client.get(page).context['page_obj']
+                self.assertEqual(len(first), settings.POSTS_PER_PAGE)
+                self.assertFalse(first.has_previous())
+                second = self.authorized_client.get(
+                    page, {'after': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second), SECOND_PAGE_PAGINATOR_POSTS)
+                self.assertFalse(second.has_next())
+                back = self.authorized_client.get(
+                    page, {'before': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+                self.assertTrue(set(first).isdisjoint(second))
+
+    def test_broken_cursor_returns_first_page(self):
+        """ Испорченный токен отдаёт первую страницу. """
+        response = self.authorized_client.get(
+            self.pages[0], {'after': 'не-токен'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+@override_settings(POSTS_COUNT_ESTIMATE_THRESHOLD=None)
+class QueryCountTests(TestCase):
+    """ Число запросов страницы не зависит от числа постов на ней. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author_{number}')
+            for number in range(3)
+        ]
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {number}',
+                slug=f'group-{number}',
+                description='Описание'
+            )
+            for number in range(3)
+        ]
+        for number in range(SUM_OF_PAGINATOR_POSTS):
+            cls.post = Post.objects.create(
+                text=f'Пост {number}',
+                author=cls.authors[number % 3],
+                group=cls.groups[number % 3]
+            )
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_listing_query_count(self):
+        """ Карточки постов не делают запросов на каждую строку. """
+        pages = (
+            # первый запрос каждой страницы — ревизия для ETag
+            (self.guest_client, reverse('posts:index'), 3),
+            (self.guest_client, reverse(
+                'posts:group_lists', kwargs={'slug': 'group-0'}), 4),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': 'author_0'}), 3),
+            (self.guest_client, reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}), 4),
+            # с загрузкой массива подписок в пустой кэш
+            (self.reader_client, reverse('posts:follow_index'), 7),
+        )
+        for client, url, queries in pages:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    client.get(url)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Etag')
+        cls.other = User.objects.create_user(username='Other')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_listing_not_modified(self):
+        """ Повторный запрос ленты с ETag отдаёт 304 одним запросом
+        ревизии — и в процессе с пустым кэшем тоже. """
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_only_for_anonymous(self):
+        """ Last-Modified отдаётся только анонимам. """
+        url = reverse('posts:profile', kwargs={'username': 'Etag'})
+        response = self.guest_client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(
+            self.authorized_client.get(url).has_header('Last-Modified'))
+
+    def test_etag_depends_on_user(self):
+        """ ETag ленты различается у разных пользователей. """
+        url = reverse('posts:index')
+        etag = self.authorized_client.get(url)['ETag']
+        self.assertNotEqual(self.guest_client.get(url)['ETag'], etag)
+        other_client = Client()
+        other_client.force_login(self.other)
+        response = other_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_changes_with_comments(self):
+        """ Новый комментарий меняет ETag страницы поста. """
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=self.post, author=self.other, text='Комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Commentator')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.user)
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {number}')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_comments_loaded_in_batches(self):
+        """ Комментарии выводятся порциями, следующая — по курсору. """
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        comments = self.guest_client.get(url).context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 0', 'Комментарий 1']
+        )
+        more = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'after': comments.next_cursor}
+        )
+        self.assertTemplateUsed(more, 'posts/includes/comment_list.html')
+        self.assertTemplateNotUsed(more, 'base.html')
+        self.assertEqual(
+            [comment.text for comment in more.context['comments']],
+            ['Комментарий 2', 'Комментарий 3']
+        )
+
+    def test_newest_first(self):
+        """ ?order=newest выводит сначала новые комментарии. """
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            {'order': 'newest'}
+        )
+        self.assertEqual(
+            response.context['comments'][0].text, 'Комментарий 4')
+
+    def test_comment_batch_query_count(self):
+        """ Порция комментариев с авторами читается одним запросом. """
+        with self.assertNumQueries(2):
+            self.guest_client.get(reverse(
+                'posts:post_comments', kwargs={'post_id': self.post.pk}))
+
+    def test_comments_of_missing_post(self):
+        """ Для несуществующего поста возвращается 404. """
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
 class FollowTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -321,6 +573,7 @@ class FollowTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         self.follower_client = Client()
@@ -357,3 +610,167 @@ class FollowTests(TestCase):
         self.assertEqual(test_page, self.post.text)
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotContains(response, self.post.text)
+
+    def test_follow_feed_inbox_fan_out_and_trim(self):
+        """ Подписка переносит посты автора в ленту,
+        новые посты раскладываются, отписка их убирает. """
+        Follow.objects.create(user=self.follower, author=self.user)
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.follower, post=self.post).exists())
+        new_post = Post.objects.create(text='Свежий пост', author=self.user)
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.follower, post=new_post).exists())
+        Follow.objects.filter(user=self.follower, author=self.user).delete()
+        self.assertFalse(FeedItem.objects.filter(user=self.follower).exists())
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_follow_feed_pull_author(self):
+        """ Посты популярного автора читаются без раскладки по лентам. """
+        Follow.objects.create(user=self.follower, author=self.user)
+        Post.objects.create(text='Пост для всех', author=self.user)
+        self.assertFalse(FeedItem.objects.exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_follow_feed_author_back_under_threshold(self):
+        """ Посты, опубликованные, пока автор был pull-автором,
+        раскладываются, когда подписчиков снова не больше порога. """
+        other = User.objects.create_user(username='other_reader')
+        Follow.objects.create(user=self.follower, author=self.user)
+        Follow.objects.create(user=other, author=self.user)
+        pull_post = Post.objects.create(text='Пост для всех', author=self.user)
+        self.assertFalse(FeedItem.objects.filter(post=pull_post).exists())
+        Follow.objects.filter(user=other, author=self.user).delete()
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(pull_post, response.context['page_obj'])
+
+
+class ProfileHeaderTests(TransactionTestCase):
+    # Массив подписок правится в on_commit, которого нет в TestCase
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='Header', first_name='Анна', last_name='Ахматова')
+        self.reader = User.objects.create_user(username='Reader')
+        for number in range(3):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        self.url = reverse('posts:profile', kwargs={'username': 'Header'})
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def header(self):
+        response = self.reader_client.get(self.url)
+        author = response.context['author']
+        return (
+            author.get_full_name(),
+            author.stats.posts_count,
+            author.stats.followers_count,
+            response.context['following'],
+        )
+
+    def test_header_cached(self):
+        """ Шапка берётся из кэша; подписка зрителя не видна другим. """
+        self.assertEqual(self.header(), ('Анна Ахматова', 3, 0, False))
+        self.reader_client.get(self.url)
+        with self.assertNumQueries(4):
+            # сессия, пользователь, ревизия и страница постов
+            self.reader_client.get(self.url, {'page': 1})
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.header(), ('Анна Ахматова', 3, 1, True))
+        guest = Client().get(self.url)
+        self.assertFalse(guest.context['following'])
+        self.assertEqual(guest.context['author'].stats.followers_count, 1)
+
+    def test_header_invalidated(self):
+        """ Новый пост и смена имени сбрасывают шапку автора. """
+        self.header()
+        Post.objects.create(text='Ещё пост', author=self.author)
+        self.assertEqual(self.header()[1], 4)
+        self.author.first_name = 'Марина'
+        self.author.save()
+        self.assertEqual(self.header()[0], 'Марина Ахматова')
+        Follow.objects.create(user=self.author, author=self.reader)
+        reader_url = reverse('posts:profile', kwargs={'username': 'Reader'})
+        self.reader_client.get(reader_url)
+        Follow.objects.filter(user=self.author).delete()
+        response = self.reader_client.get(reader_url)
+        self.assertEqual(response.context['author'].stats.followers_count, 0)
+
+    def test_missing_author(self):
+        """ Профиль несуществующего пользователя — 404. """
+        response = self.reader_client.get(
+            reverse('posts:profile', kwargs={'username': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class FollowingCacheTests(TransactionTestCase):
+    # Массив подписок правится в on_commit, которого нет в TestCase
+    def setUp(self):
+        self.reader = User.objects.create_user(username='Reader')
+        self.authors = [
+            User.objects.create_user(username=f'author_{number}')
+            for number in range(4)
+        ]
+        self.post = Post.objects.create(text='Пост', author=self.authors[2])
+        for author in self.authors[1::2]:
+            Follow.objects.create(user=self.reader, author=author)
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_following_ids(self):
+        """ Подписки — отсортированный массив id, правится сигналами. """
+        reader = User.objects.get(pk=self.reader.pk)
+        expected = sorted(author.pk for author in self.authors[1::2])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(following_ids(reader)), expected)
+            self.assertTrue(is_following(reader, self.authors[1]))
+            self.assertFalse(is_following(reader, self.authors[2].pk))
+        Follow.objects.create(user=self.reader, author=self.authors[2])
+        Follow.objects.filter(
+            user=self.reader, author=self.authors[1]).delete()
+        reader = User.objects.get(pk=self.reader.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(following_ids(reader)),
+                sorted([self.authors[2].pk, self.authors[3].pk]))
+        self.assertEqual(len(following_ids(AnonymousUser())), 0)
+
+    def test_rolled_back_follow_not_cached(self):
+        """ Откаченная подписка не попадает в закэшированный массив. """
+        following_ids(User.objects.get(pk=self.reader.pk))
+        try:
+            with transaction.atomic():
+                Follow.objects.create(
+                    user=self.reader, author=self.authors[0])
+                raise ValueError
+        except ValueError:
+            pass
+        reader = User.objects.get(pk=self.reader.pk)
+        self.assertFalse(is_following(reader, self.authors[0]))
+
+    def test_follow_buttons(self):
+        """ Кнопки подписки на странице поста и в профиле. """
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        profile_url = reverse('posts:profile', args=['author_2'])
+        follow_url = reverse('posts:profile_follow', args=['author_2'])
+        for url in (post_url, profile_url):
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertContains(response, follow_url)
+        self.reader_client.get(follow_url)
+        unfollow_url = reverse('posts:profile_unfollow', args=['author_2'])
+        for url in (post_url, profile_url):
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertContains(response, unfollow_url)
+
+    def test_follow_index_warm_cache(self):
+        """ С массивом подписок в кэше лента не читает Follow. """
+        url = reverse('posts:follow_index')
+        self.reader_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(url, {'page': 1})
+        self.assertFalse(any(
+            'posts_follow' in query['sql'] for query in queries))
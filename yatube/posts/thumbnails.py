@@ -0,0 +1,175 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from .cache import bump_version
+from .models import Post
+from .revisions import bump_revision
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Отдаёт только готовые миниатюры, не обрабатывая картинку в запросе.
+
+    Если миниатюры ещё нет, её генерация ставится в очередь фоновых
+    потоков, а get_thumbnail возвращает None: тег {% thumbnail %}
+    в этом случае выводит блок {% empty %} с заглушкой.
+    """
+
+    def _prepare_options(self, source, options):
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        options = self._prepare_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        thumbnail = self.get_cached_thumbnail(
+            file_, geometry_string, **options)
+        if thumbnail is None:
+            enqueue(file_)
+        return thumbnail
+
+    def generate_thumbnail(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def image_formats():
+    """Форматы из POST_CARD_IMAGE_FORMATS, которые умеет сохранять Pillow.
+
+    Например, WebP есть не в каждой сборке; JPEG нужен всегда.
+    """
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_CARD_IMAGE_FORMATS
+        if image_format == 'JPEG' or image_format.upper() in Image.SAVE
+    ]
+
+
+def mime_type(image_format):
+    Image.init()
+    return Image.MIME.get(image_format.upper(), 'image/jpeg')
+
+
+def variant_geometry(width):
+    base_width, base_height = settings.POST_CARD_IMAGE_SIZE
+    return f'{width}x{max(1, round(width * base_height / base_width))}'
+
+
+def variants():
+    """(геометрия, опции) всех вариантов картинки карточки."""
+    for width in settings.POST_CARD_IMAGE_WIDTHS:
+        for image_format in image_formats():
+            yield variant_geometry(width), {
+                'crop': 'center',
+                'upscale': True,
+                'format': image_format,
+            }
+
+
+def generate(file_):
+    """Создаёт все варианты картинки карточки (variants) и записывает
+    готовые в image_variants постов с этой картинкой.
+
+    Повторно загруженная картинка хранится под тем же именем,
+    и её готовые миниатюры используются как есть.
+    """
+    backend = default.backend
+    found = {}
+    for geometry, options in variants():
+        if backend.get_cached_thumbnail(file_, geometry, **options) is None:
+            try:
+                backend.generate_thumbnail(file_, geometry, **options)
+            except Exception:
+                logger.exception(
+                    'Не удалось создать миниатюру %s', file_.name)
+        # Без исходника sorl возвращает миниатюру, которой нет в kvstore
+        thumbnail = backend.get_cached_thumbnail(file_, geometry, **options)
+        if thumbnail is not None:
+            found.setdefault(options['format'], []).append(
+                [thumbnail.width, thumbnail.name])
+    stored = json.dumps(found, separators=(',', ':'))
+    updated = Post.objects.filter(image=file_.name).exclude(
+        image_variants=stored).update(image_variants=stored)
+    if updated:
+        bump_version('listing')
+        bump_revision('listing')
+
+
+def stored_variants(post):
+    """Готовые варианты из post.image_variants без обращений к kvstore:
+    {формат: [(ширина, url), ...]}.
+    """
+    if not post.image_variants:
+        return {}
+    storage = default.storage
+    return {
+        image_format: [(width, storage.url(name)) for width, name in found]
+        for image_format, found in json.loads(post.image_variants).items()
+    }
+
+
+def _run(file_):
+    try:
+        generate(file_)
+    finally:
+        with _lock:
+            _pending.discard(file_.name)
+        if settings.THUMBNAIL_WORKERS:
+            connection.close()
+
+
+def enqueue(file_):
+    """Ставит генерацию миниатюр в очередь после коммита транзакции."""
+    if not file_:
+        return
+
+    def submit():
+        with _lock:
+            if file_.name in _pending:
+                return
+            _pending.add(file_.name)
+        if settings.THUMBNAIL_WORKERS:
+            _get_executor().submit(_run, file_)
+        else:
+            _run(file_)
+
+    transaction.on_commit(submit)
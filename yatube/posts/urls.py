@@ -1,16 +1,30 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 app_name = 'post'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('feed/rss/', feeds.rss_feed, name='rss'),
+    path('feed/atom/', feeds.atom_feed, name='atom'),
     path('group/<slug:slug>/', views.group_posts, name='group_lists'),
+    path('group/<slug:slug>/rss/', feeds.rss_feed, name='group_rss'),
+    path('group/<slug:slug>/atom/', feeds.atom_feed, name='group_atom'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/rss/', feeds.rss_feed, name='profile_rss'),
+    path(
+        'profile/<str:username>/atom/',
+        feeds.atom_feed,
+        name='profile_atom'
+    ),
+    path('search/', views.search, name='search'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
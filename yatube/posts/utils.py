@@ -1,12 +1,321 @@
+import base64
+import binascii
+import hashlib
+import json
+from collections.abc import Sequence
+from math import ceil
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from core.metrics import record_cache
+from core.routers import cache_timeout
+
+from .cache import get_version
+
+CURSOR_ORDERING = ('-pub_date', '-id')
+
+COMMENT_ORDERINGS = {
+    'oldest': ('created', 'id'),
+    'newest': ('-created', '-id'),
+}
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачный токен."""
+    raw = json.dumps(values, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для испорченного токена возвращает None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class CursorPage(Sequence):
+    """Страница keyset-пагинации: без номера и без общего количества."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по полям ordering (по умолчанию pub_date, id).
+
+    Следующая страница выбирается условием по ключу последней записи,
+    поэтому любая страница стоит столько же, сколько первая,
+    а COUNT(*) не нужен.
+    """
+
+    def __init__(self, queryset, per_page, ordering=CURSOR_ORDERING):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+
+    def _key(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.fields]
+        return [getattr(obj, field) for field in self.fields]
+
+    def _parse(self, token):
+        values = decode_cursor(token)
+        if values is None or len(values) != len(self.fields):
+            return None
+        opts = self.queryset.model._meta
+        try:
+            return [
+                opts.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            return None
+
+    def _seek(self, values, forward):
+        """Условие «строго после ключа» в направлении обхода."""
+        condition = Q()
+        for index, ordering in enumerate(self.ordering):
+            descending = ordering.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            term = Q(**{f'{self.fields[index]}__{lookup}': values[index]})
+            for field, value in zip(self.fields[:index], values[:index]):
+                term &= Q(**{field: value})
+            condition |= term
+        return condition
+
+    def _reversed_ordering(self):
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
 
+    def page(self, after=None, before=None):
+        after_values = self._parse(after)
+        before_values = None if after_values else self._parse(before)
+        queryset = self.queryset
+        if before_values is not None:
+            rows = list(
+                queryset.filter(self._seek(before_values, forward=False))
+                .order_by(*self._reversed_ordering())[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            if after_values is not None:
+                queryset = queryset.filter(
+                    self._seek(after_values, forward=True))
+            rows = list(
+                queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = after_values is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self._key(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor(self._key(rows[0]))
+        return CursorPage(rows, next_cursor, previous_cursor)
 
-def pagination(queryset, request):
 
-    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+class CappedPaginator(Paginator):
+    """Номерной пагинатор, не пускающий дальше max_pages страниц.
+
+    Глубже последней доступной страницы листают курсором
+    (см. cursor_after), чтобы OFFSET не рос бесконечно.
+    """
+
+    def __init__(self, object_list, per_page, max_pages=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.max_pages = max_pages or settings.POSTS_MAX_PAGE
+
+    @cached_property
+    def num_pages(self):
+        if self.count == 0 and not self.allow_empty_first_page:
+            return 0
+        hits = max(1, self.count - self.orphans)
+        return min(ceil(hits / self.per_page), self.max_pages)
+
+    @property
+    def truncated(self):
+        return self.num_pages * self.per_page < self.count
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы по статистике СУБД без COUNT(*).
+
+    Работает только для нефильтрованного queryset; если статистики
+    нет (например, SQLite без ANALYZE), возвращает None.
+    """
+    if queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class CachedCountPaginator(CappedPaginator):
+    """Пагинатор, берущий количество записей из кэша.
+
+    Ключ зависит от SQL запроса и версии 'posts', которую сигналы
+    сдвигают при сохранении и удалении Post и Follow. Для больших
+    нефильтрованных выборок вместо COUNT(*) используется оценка.
+    Уже известное число (например, счётчик автора) передаётся в count.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+    def _cache_key(self):
+        sql, params = self.object_list.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}{params!r}'.encode()).hexdigest()
+        return f'posts:count:{get_version("posts")}:{digest}'
+
+    @cached_property
+    def count(self):
+        key = self._cache_key()
+        count = cache.get(key)
+        record_cache('post_count', count is not None)
+        if count is None:
+            threshold = settings.POSTS_COUNT_ESTIMATE_THRESHOLD
+            if threshold is not None:
+                count = estimate_count(self.object_list)
+                if count is not None and count < threshold:
+                    count = None
+            if count is None:
+                count = self.object_list.count()
+            cache.set(key, count, cache_timeout(
+                settings.POSTS_COUNT_CACHE_TIMEOUT, self.object_list.db))
+        return count
+
+
+def cursor_after(page_obj):
+    """Курсор для продолжения после последней доступной номерной страницы."""
+    paginator = page_obj.paginator
+    if (page_obj.number != paginator.num_pages
+            or not paginator.truncated or not len(page_obj)):
+        return None
+    last = page_obj[-1]
+    fields = [field.lstrip('-') for field in CURSOR_ORDERING]
+    return encode_cursor([getattr(last, field) for field in fields])
+
+
+def elided_page_range(page_obj, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей; пропуски обозначены None.
+
+    Длина результата зависит только от размера окна,
+    а не от общего числа страниц.
+    """
+    number = page_obj.number
+    num_pages = page_obj.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > on_each_side + on_ends + 1:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(None)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(None)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
+
+
+def get_page_size(request):
+    """Размер страницы из ?size=, ограниченный POSTS_PER_PAGE_MAX."""
+    try:
+        size = int(request.GET.get('size', settings.POSTS_PER_PAGE))
+    except ValueError:
+        return settings.POSTS_PER_PAGE
+    return max(1, min(size, settings.POSTS_PER_PAGE_MAX))
+
+
+def pagination(queryset, request, mode=None, ordering=CURSOR_ORDERING,
+               count=None):
+    """Возвращает контекст страницы в номерном или keyset-режиме.
+
+    Keyset-режим включается настройкой POSTS_PAGINATION = 'cursor',
+    аргументом mode либо наличием ?after= / ?before= в запросе.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    per_page = get_page_size(request)
+    if mode is None:
+        mode = 'cursor' if after or before else settings.POSTS_PAGINATION
+    if mode == 'cursor':
+        paginator = CursorPaginator(queryset, per_page, ordering)
+        page_obj = paginator.page(after=after, before=before)
+    else:
+        paginator = CachedCountPaginator(queryset, per_page, count=count)
+        page_obj = paginator.get_page(request.GET.get('page'))
     return {
         'page_obj': page_obj,
     }
+
+
+def comment_pagination(queryset, request):
+    """Порция комментариев после ?after= в порядке из ?order=."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERINGS:
+        order = settings.COMMENTS_ORDER
+    paginator = CursorPaginator(
+        queryset, settings.COMMENTS_PER_PAGE, COMMENT_ORDERINGS[order])
+    return {
+        'comments': paginator.page(after=request.GET.get('after')),
+        'comments_order': order,
+    }
@@ -1,19 +1,80 @@
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
 
+from core.database import retry_on_lock
+from core.routers import read_from_replica
+
+from .feed import follow_feed_page
+from .following import is_following
 from .forms import CommentForm, PostForm
 from .models import Comment, Follow, Group, Post, User
-from .utils import pagination
+from .profiles import header_author, profile_header
+from .revisions import get_revisions
+from .search import search_posts
+from .utils import (CursorPage, comment_pagination, get_page_size,
+                    pagination)
+
+
+def _viewer(request):
+    if request.user.is_authenticated:
+        return f'user-{request.user.pk}'
+    return 'anon'
+
+
+def listing_etag(request, *args, **kwargs):
+    """Ревизия 'listing' плюс зритель: один запрос по первичному ключу.
+
+    Ревизия хранится в базе рядом с данными, а не в кэше процесса,
+    поэтому её видят все воркеры, а в реплике она совпадает с её же
+    строками.
+    """
+    value, _ = get_revisions(request, 'listing')['listing']
+    return f'{value}-{_viewer(request)}'
+
+
+def listing_last_modified(request, *args, **kwargs):
+    """Время смены ревизии 'listing' — только для анонимов.
+
+    Страница авторизованного пользователя зависит от того, кто
+    смотрит, а If-Modified-Since этого не различает.
+    """
+    if request.user.is_authenticated:
+        return None
+    return get_revisions(request, 'listing')['listing'][1]
+
+
+def post_etag(request, post_id):
+    """Ревизия ленты плюс число комментариев поста.
+
+    Комментарии не сдвигают ревизию 'listing', поэтому Last-Modified
+    у страницы поста нет: удаление комментария не сдвинуло бы его.
+    """
+    comments_count = Post.objects.filter(pk=post_id).order_by().values_list(
+        'comments_count', flat=True).first()
+    if comments_count is None:
+        return None
+    return f'{listing_etag(request)}-{comments_count}'
+
+
+listing_condition = condition(
+    etag_func=listing_etag, last_modified_func=listing_last_modified)
 
 
+@read_from_replica
+@listing_condition
 def index(request):
-    posts = pagination(Post.objects.all(), request)
+    posts = pagination(Post.objects.for_feed(), request)
     return render(request, 'posts/index.html', posts)
 
 
+@read_from_replica
+@listing_condition
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.for_feed()
     context = {
         'group': group
     }
@@ -21,33 +82,83 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@read_from_replica
+@listing_condition
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author
-    ).exists()
+    header = profile_header(username)
+    if header is None:
+        raise Http404('Пользователь не найден.')
     context = {
-        'author': author,
-        'following': following,
+        'author': header_author(header),
+        'following': is_following(request.user, header['id']),
         'request_user': request.user
     }
-    context.update(pagination(author.posts.all(), request))
+    context.update(pagination(
+        Post.objects.filter(author_id=header['id']).for_feed(),
+        request,
+        count=header['posts_count']
+    ))
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    group = author = None
+    if request.GET.get('group'):
+        group = Group.objects.filter(slug=request.GET['group']).first()
+    if request.GET.get('author'):
+        author = User.objects.filter(username=request.GET['author']).first()
+    if (request.GET.get('group') and group is None
+            or request.GET.get('author') and author is None):
+        # Фильтр по несуществующей группе или автору ничего не находит
+        page_obj = CursorPage([])
+    else:
+        page_obj = search_posts(
+            query,
+            get_page_size(request),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            group=group,
+            author=author
+        )
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.only('title', 'slug'),
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@read_from_replica
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = Comment.objects.filter(post=post)
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__stats'), id=post_id)
     form = CommentForm(request.POST or None)
     context = {
         'posts': post,
         'form': form,
-        'comments': comments
     }
+    context.update(comment_pagination(
+        Comment.objects.filter(post=post).for_thread(), request))
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    context = {
+        'posts': post,
+    }
+    context.update(comment_pagination(
+        Comment.objects.filter(post=post).for_thread(), request))
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
+@retry_on_lock
+@transaction.atomic
 def post_create(request):
     is_edit = False
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -63,6 +174,8 @@ def post_create(request):
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def post_edit(request, post_id):
     is_edit = True
     user = request.user
@@ -84,6 +197,8 @@ def post_edit(request, post_id):
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -97,16 +212,17 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_from_replica
 @login_required
 def follow_index(request):
-    following = Post.objects.filter(
-        author__following__user=request.user)
     context = {}
-    context.update(pagination(following, request))
+    context.update(follow_feed_page(request))
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -115,6 +231,8 @@ def profile_follow(request, username):
 
 
 @login_required
+@retry_on_lock
+@transaction.atomic
 def profile_unfollow(request, username):
     user = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=user).delete()
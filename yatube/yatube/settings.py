@@ -33,14 +33,17 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'posts',
-    'core',
+    'posts.apps.PostsConfig',
+    'core.apps.CoreConfig',
     'about',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReadPrimaryAfterWriteMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,7 +67,7 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,13 +88,57 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Соединения живут CONN_MAX_AGE секунд и перед каждым запросом
+# проверяются (DATABASE_HEALTH_CHECKS, см. core.database).
+# replica — копия default, которую обновляет manage.py sync_replicas
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 60,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# Читающие view (core.routers.read_from_replica) ходят в одну из
+# DATABASE_REPLICAS; после записи пользователь REPLICA_STICKY_SECONDS
+# читает из default, чтобы сразу видеть свой пост или комментарий
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+DATABASE_REPLICAS = ['replica']
+
+REPLICA_STICKY_SECONDS = 15
+
+REPLICA_STICKY_COOKIE = 'read_primary_until'
+
+# Пауза между копированиями в sync_replicas --interval, в секундах;
+# должна быть заметно меньше REPLICA_STICKY_SECONDS
+REPLICA_SYNC_INTERVAL = 5
+
+DATABASE_HEALTH_CHECKS = True
+
+# PRAGMA для каждого нового соединения SQLite: WAL позволяет читать
+# во время записи, busy_timeout — ждать блокировку, а не падать сразу
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+# Повторы пишущих view при «database is locked»: число попыток
+# и первая пауза в секундах (дальше удваивается)
+DATABASE_RETRY_ATTEMPTS = 4
+
+DATABASE_RETRY_DELAY = 0.05
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -137,6 +184,55 @@ STATIC_URL = '/static/'
 
 POSTS_PER_PAGE = 10
 
+# 'page' — номера страниц, 'cursor' — keyset-пагинация по ?after=/?before=
+POSTS_PAGINATION = 'page'
+
+# Верхняя граница для ?size= и последняя доступная номерная страница
+POSTS_PER_PAGE_MAX = 50
+
+POSTS_MAX_PAGE = 100
+
+# Количество записей в лентах кэшируется; для нефильтрованной ленты
+# больше порога берётся оценка из статистики СУБД (None — всегда COUNT)
+POSTS_COUNT_CACHE_TIMEOUT = 60
+
+POSTS_COUNT_ESTIMATE_THRESHOLD = 100000
+
+# Комментарии на странице поста подгружаются порциями по курсору;
+# порядок по умолчанию: 'oldest' или 'newest' (меняется ?order=)
+COMMENTS_PER_PAGE = 20
+
+COMMENTS_ORDER = 'oldest'
+
+# Лента подписок раскладывается по читателям при публикации;
+# посты авторов с большим числом подписчиков читаются напрямую
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+
+FEED_BATCH_SIZE = 1000
+
+# До стольких подписок pull-авторы ищутся по id из кэша подписок
+# (IN-список), при большем числе — JOIN с Follow
+FEED_PULL_LOOKUP_MAX = 500
+
+# Фрагменты лент сбрасываются сигналами (версия 'listing')
+LISTING_CACHE_TIMEOUT = 20
+
+# Шапка профиля (автор и счётчики) кэшируется
+# и сбрасывается сигналами по автору
+PROFILE_CACHE_TIMEOUT = 60
+
+# Подписки пользователя: отсортированный массив id авторов в кэше,
+# правится сигналами Follow
+FOLLOWING_CACHE_TIMEOUT = 60
+
+# RSS/Atom: записей в ленте, размер пачки при потоковой отдаче
+# и срок жизни готового документа (сбрасывается версией 'listing')
+SYNDICATION_ITEMS = 50
+
+SYNDICATION_CHUNK_SIZE = 20
+
+SYNDICATION_CACHE_TIMEOUT = 60
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -149,8 +245,76 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Миниатюры создаются фоновыми потоками при загрузке картинки;
+# 0 — в том же потоке сразу после коммита
+THUMBNAIL_BACKEND = 'posts.thumbnails.PregeneratedThumbnailBackend'
+
+THUMBNAIL_WORKERS = 2
+
+# Загрузки пишутся на диск частями, а не собираются в памяти
+FILE_UPLOAD_HANDLERS = (
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+)
+
+# Картинки постов при загрузке ужимаются до POST_IMAGE_MAX_SIZE по
+# длинной стороне и пересохраняются без метаданных. Больше
+# POST_IMAGE_MAX_PIXELS по заголовку не принимаются; JPEG декодируется
+# сразу уменьшенным (draft), прочие — целиком, поэтому после draft
+# в памяти должно оказаться не больше POST_IMAGE_MAX_DECODED_PIXELS
+POST_IMAGE_MAX_SIZE = 2048
+
+POST_IMAGE_MAX_PIXELS = 80 * 1000 * 1000
+
+POST_IMAGE_MAX_DECODED_PIXELS = 25 * 1000 * 1000
+
+POST_IMAGE_QUALITY = 85
+
+# Картинка карточки: базовый размер (src, width/height, пропорции),
+# ширины вариантов для srcset и форматы в порядке предпочтения.
+# Все варианты создаются заранее; форматы, которые Pillow не умеет
+# сохранять, пропускаются, JPEG остаётся запасным
+POST_CARD_IMAGE_SIZE = (960, 339)
+
+POST_CARD_IMAGE_WIDTHS = (320, 640, 960, 1440)
+
+POST_CARD_IMAGE_FORMATS = ('WEBP', 'JPEG')
+
+POST_CARD_IMAGE_SIZES = '(min-width: 992px) 960px, 100vw'
+
+# Размытая копия картинки в data: URI, видна до загрузки варианта
+POST_PLACEHOLDER_WIDTH = 32
+
+POST_PLACEHOLDER_QUALITY = 40
+
+# Кэш у каждого процесса свой: сдвиг версии в одном воркере не виден
+# остальным, поэтому *_CACHE_TIMEOUT ниже — минуты, а не сутки. С общим
+# кэшем (memcached, redis) их можно поднять: данные сбрасывают сигналы
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'metrics'),
+    },
 }
+
+# Метрики Prometheus (/metrics): снимки процессов сбрасываются в общий
+# для всех воркеров кэш METRICS_CACHE не чаще раза в
+# METRICS_FLUSH_INTERVAL секунд; None в METRICS_ALLOWED_IPS —
+# эндпоинт доступен с любого адреса. REMOTE_ADDR — адрес соседнего узла:
+# за обратным прокси на той же машине это всегда 127.0.0.1, и проверка
+# по адресу пропускает любого клиента прокси. В таком случае закройте
+# /metrics на прокси или задайте METRICS_TOKEN — тогда нужен заголовок
+# Authorization: Bearer <токен>
+METRICS_ENABLED = True
+
+METRICS_CACHE = 'metrics'
+
+METRICS_FLUSH_INTERVAL = 10
+
+METRICS_TTL = 24 * 60 * 60
+
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+METRICS_TOKEN = None